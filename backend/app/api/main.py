@@ -5,14 +5,15 @@ from fastapi import FastAPI
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 
-from .routes import auth, problems, comments
-from .utils.database_handler import (
-    close_db,
-    open_db,
-    create_user_db,
-    create_problems_db,
-    create_comments_db,
-)
+from .routes import auth, problems, comments, exams, users, admin
+from .utils.database_handler import close_db, open_db
+from .utils.duplicate_handler import build_duplicate_index
+from .utils.exam_handler import start_exam_engine, stop_exam_engine
+from .utils.migration_handler import run_migrations
+from .utils.profile_handler import ProfilingMiddleware
+from .utils.recommendation_handler import build_recommendation_index
+from .utils.task_handler import start_task_workers, stop_task_workers
+from .utils.trending_handler import start_trending_engine, stop_trending_engine
 
 origins = ["http://localhost:8000", "http://localhost:3000"]
 
@@ -21,12 +22,23 @@ origins = ["http://localhost:8000", "http://localhost:3000"]
 async def lifespan(app: FastAPI):
 
     await open_db()
+    await run_migrations()
+    await start_task_workers()
+    await build_recommendation_index()
+    await build_duplicate_index()
+    await start_exam_engine()
+    await start_trending_engine()
     yield
 
+    await stop_trending_engine()
+    await stop_exam_engine()
+    await stop_task_workers()
     await close_db()
 
 
 app = FastAPI(lifespan=lifespan)
+# Added first so it runs inside SessionMiddleware and can see the session.
+app.add_middleware(ProfilingMiddleware)
 app.add_middleware(SessionMiddleware, secret_key=os.environ["SECRET"])
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +49,13 @@ app.add_middleware(
 )
 
 
-routers = [auth.router, problems.router, comments.router]
+routers = [
+    auth.router,
+    problems.router,
+    comments.router,
+    exams.router,
+    users.router,
+    admin.router,
+]
 for router in routers:
     app.include_router(router)
@@ -0,0 +1,36 @@
+import argparse, asyncio, logging
+from .utils.database_handler import open_db, close_db
+from .utils.migration_handler import run_migrations
+from .utils.seed_handler import seed, SEED_BATCH_SIZE
+
+
+async def main(args: argparse.Namespace) -> None:
+    await open_db()
+    try:
+        if args.command == "migrate":
+            ran = await run_migrations()
+            print(f"Applied migrations: {ran or 'none pending'}")
+        elif args.command == "seed":
+            # Seeded documents must meet the validators and unique indexes.
+            await run_migrations()
+            op = await seed(
+                args.problems, args.users, args.comments, args.seed, args.batch_size
+            )
+            print(f"Seeded: {op}")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="prepr database management")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="apply pending schema migrations")
+    seeder = commands.add_parser("seed", help="insert synthetic test data")
+    seeder.add_argument("--problems", type=int, default=0)
+    seeder.add_argument("--users", type=int, default=0)
+    seeder.add_argument("--comments", type=int, default=0)
+    seeder.add_argument("--seed", type=int, default=None, help="random seed")
+    seeder.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE)
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args()))
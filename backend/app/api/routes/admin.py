@@ -0,0 +1,77 @@
+import logging, pydantic
+from dotenv import load_dotenv, find_dotenv
+from fastapi import APIRouter, HTTPException, status, Request, Depends
+from fastapi.responses import JSONResponse, Response
+from ..utils import profile_handler
+from ..utils.session_handler import is_admin
+from ..utils.task_handler import get_metrics
+
+load_dotenv(find_dotenv())
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(is_admin)])
+logger = logging.getLogger(__name__)
+
+
+@router.get("/tasks", response_class=JSONResponse, status_code=status.HTTP_200_OK)
+async def get_task_metrics_ep(request: Request):
+    return JSONResponse(content={"tasks": get_metrics()})
+
+
+class ProfilingForm(pydantic.BaseModel):
+    sample_rate: float
+
+    @pydantic.field_validator("sample_rate")
+    @classmethod
+    def validate_sample_rate(cls, v):
+        if not 0 <= v <= 1:
+            raise ValueError("Sample rate should be between 0 and 1")
+        return v
+
+
+@router.put("/profiling", response_class=JSONResponse, status_code=status.HTTP_200_OK)
+async def set_profiling_ep(request: Request, form: ProfilingForm):
+    profile_handler.set_sample_rate(form.sample_rate)
+    return JSONResponse(content={"sample_rate": profile_handler.sample_rate})
+
+
+@router.get("/profiles", response_class=JSONResponse, status_code=status.HTTP_200_OK)
+async def get_profiles_ep(request: Request):
+    return JSONResponse(
+        content={
+            "sample_rate": profile_handler.sample_rate,
+            "profiles": [
+                {**profile_handler.summary(x), "spans": len(x["spans"])}
+                for x in profile_handler.profiles
+            ],
+        }
+    )
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    response_class=JSONResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def get_profile_ep(request: Request, profile_id: int):
+    profile = profile_handler.get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return JSONResponse(content={"profile": profile_handler.summary(profile)})
+
+
+@router.get(
+    "/profiles/{profile_id}/pstats",
+    response_class=Response,
+    status_code=status.HTTP_200_OK,
+)
+async def download_profile_ep(request: Request, profile_id: int):
+    profile = profile_handler.get_profile(profile_id)
+    if not profile or not profile["_pstats"]:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return Response(
+        content=profile["_pstats"],
+        media_type="application/octet-stream",
+        headers={
+            "Content-Disposition": f'attachment; filename="profile-{profile_id}.prof"'
+        },
+    )
@@ -3,8 +3,14 @@ from dotenv import load_dotenv, find_dotenv
 from fastapi import APIRouter, HTTPException, status, Request, Depends
 from fastapi.responses import JSONResponse
 from starlette.responses import RedirectResponse
-from ..utils.database_handler import create_google_user, get_user_by_id, UserModel
+from ..utils.database_handler import (
+    create_google_user,
+    get_user_by_id,
+    update_user_session,
+    UserModel,
+)
 from ..utils.session_handler import is_logged_in
+from ..utils.task_handler import enqueue
 
 load_dotenv(find_dotenv())
 
@@ -16,6 +22,13 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 logger = logging.getLogger(__name__)
 
 
+async def log_login(username: str, created: bool) -> None:
+    if created:
+        logger.info(f"User {username} created successfully")
+    else:
+        logger.info(f"User login {username} successful")
+
+
 @router.get("/google", response_class=RedirectResponse)
 async def google_login(request: Request) -> RedirectResponse:
     return RedirectResponse(
@@ -61,13 +74,14 @@ async def google_callback(request: Request, code: str):
                 "refresh_token": refresh_token,
             },
         )
+        user = await get_user_by_id(_id, is_google_id=True)
         if op:
-            logger.info(f"User {username} created successfully")
+            await enqueue("log", log_login, username, True)
             resp.status_code = status.HTTP_201_CREATED
         else:
-            logger.info(f"User login {username} successful")
+            await enqueue("log", log_login, username, False)
+            await enqueue("session", update_user_session, user.id, access_token)
             resp.status_code = status.HTTP_200_OK
-        user = await get_user_by_id(_id, is_google_id=True)
         request.session["user_id"] = str(user.id)
         return resp
 
@@ -0,0 +1,122 @@
+import logging, pydantic
+from dotenv import load_dotenv, find_dotenv
+from fastapi import APIRouter, HTTPException, status, Request, Depends
+from fastapi.responses import JSONResponse
+from ..utils.database_handler import get_problems_by_ids
+from ..utils.exam_handler import (
+    start_session,
+    get_session,
+    record_response,
+    submit_session,
+    ExamError,
+)
+from ..utils.grading_handler import GradingError
+from ..utils.session_handler import is_logged_in
+
+load_dotenv(find_dotenv())
+
+router = APIRouter(prefix="/exams", tags=["exams"])
+logger = logging.getLogger(__name__)
+
+
+class ExamForm(pydantic.BaseModel):
+    exam: str
+    subject: str | None = None
+    questions: int = 90
+    duration: int = 180
+
+    @pydantic.field_validator("exam")
+    @classmethod
+    def validate_exam(cls, v):
+        if v not in ["jee", "neet"]:
+            raise ValueError("Invalid exam")
+        return v
+
+    @pydantic.field_validator("questions")
+    @classmethod
+    def validate_questions(cls, v):
+        if not 1 <= v <= 200:
+            raise ValueError("Questions should be between 1 and 200")
+        return v
+
+    @pydantic.field_validator("duration")
+    @classmethod
+    def validate_duration(cls, v):
+        if not 1 <= v <= 600:
+            raise ValueError("Duration should be between 1 and 600 minutes")
+        return v
+
+
+class ResponseForm(pydantic.BaseModel):
+    answers: list[str] = []
+
+
+@router.post(
+    "/",
+    response_class=JSONResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(is_logged_in)],
+)
+async def start_exam_ep(request: Request, exam: ExamForm):
+    try:
+        session = await start_session(request.session["user_id"], **exam.model_dump())
+    except ExamError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return JSONResponse(
+        content={"session": session.model_dump(mode="json")},
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+@router.get(
+    "/{session_id}",
+    response_class=JSONResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(is_logged_in)],
+)
+async def get_exam_ep(request: Request, session_id: str):
+    try:
+        session = await get_session(session_id, request.session["user_id"])
+    except ExamError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    problems = await get_problems_by_ids(session.problems)
+    return JSONResponse(
+        content={
+            "session": session.model_dump(mode="json"),
+            "problems": [
+                problem.model_dump(exclude={"correct_answers"}) for problem in problems
+            ],
+        }
+    )
+
+
+@router.put(
+    "/{session_id}/responses/{problem_id}",
+    response_class=JSONResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(is_logged_in)],
+)
+async def record_response_ep(
+    request: Request, session_id: str, problem_id: str, response: ResponseForm
+):
+    try:
+        await record_response(
+            session_id, request.session["user_id"], problem_id, response.answers
+        )
+    except ExamError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return JSONResponse(content={"message": f"Response recorded for ID: {problem_id}"})
+
+
+@router.post(
+    "/{session_id}/submit",
+    response_class=JSONResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(is_logged_in)],
+)
+async def submit_exam_ep(request: Request, session_id: str):
+    try:
+        session = await submit_session(session_id, request.session["user_id"])
+    except (ExamError, GradingError) as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return JSONResponse(content={"session": session.model_dump(mode="json")})
@@ -1,7 +1,9 @@
 import aiohttp, os, logging, pydantic
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
 from dotenv import load_dotenv, find_dotenv
-from fastapi import APIRouter, HTTPException, status, Request, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, status, Request, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.responses import RedirectResponse
 from ..utils.database_handler import (
     get_problems,
@@ -9,14 +11,46 @@ from ..utils.database_handler import (
     update_problem,
     get_problem,
     delete_problem,
+    convert_to_bson_id,
+    build_problem_query,
+    get_problem_ids,
+    update_problems,
+    delete_problems,
+    delete_problem_comments,
+    sweep_orphan_comments,
+    get_problem_changes,
 )
-from ..utils.session_handler import is_admin
+from ..utils.duplicate_handler import (
+    signature,
+    index_question,
+    unindex_question,
+    find_duplicates,
+    duplicate_clusters,
+)
+from ..utils.export_handler import export_problems
+from ..utils.grading_handler import (
+    grade_answers,
+    record_graded_attempts,
+    GradingError,
+)
+from ..utils.recommendation_handler import (
+    INDEXED_FIELDS,
+    index_problem,
+    reindex_problem,
+    unindex_problem,
+    recommend_for_user,
+)
+from ..utils.session_handler import is_admin, is_logged_in
+from ..utils.task_handler import enqueue
+from ..utils import trending_handler
 
 load_dotenv(find_dotenv())
 
 router = APIRouter(prefix="/problems", tags=["problems"])
 logger = logging.getLogger(__name__)
 
+SYNC_SETTLE = 2  # seconds a write is held back from delta sync, see get_problem_changes
+
 
 class ProblemsForm(pydantic.BaseModel):
     exam: str
@@ -82,6 +116,105 @@ class ProblemsForm(pydantic.BaseModel):
     model_config = {"arbitrary_types_allowed": True}
 
 
+class SubmissionForm(pydantic.BaseModel):
+    problem_id: str
+    answers: list[str] = []
+
+    @pydantic.field_validator("problem_id")
+    @classmethod
+    def validate_problem_id(cls, v):
+        try:
+            convert_to_bson_id(v)
+        except InvalidId:
+            raise ValueError("Invalid problem id")
+        return v
+
+
+class GradeForm(pydantic.BaseModel):
+    submissions: list[SubmissionForm]
+
+    @pydantic.field_validator("submissions")
+    @classmethod
+    def validate_submissions(cls, v):
+        if not v:
+            raise ValueError("No submissions provided")
+        if len(v) != len(set(x.problem_id for x in v)):
+            raise ValueError("Problems should be unique")
+        return v
+
+
+class ProblemFilterForm(pydantic.BaseModel):
+    subject: str | None = None
+    type: str | None = None
+    difficulty: str | None = None
+    exam: str | None = None
+
+
+class ProblemUpdateForm(pydantic.BaseModel):
+    exam: str | None = None
+    difficulty: str | None = None
+    subject: str | None = None
+    category: str | None = None
+
+    @pydantic.field_validator("difficulty")
+    @classmethod
+    def validate_difficulty(cls, v):
+        if v is not None and v not in ["easy", "medium", "hard"]:
+            raise ValueError("Invalid difficulty")
+        return v
+
+    @pydantic.field_validator("subject")
+    @classmethod
+    def validate_subject(cls, v):
+        if v is not None and v not in [
+            "mathematics",
+            "physics",
+            "chemistry",
+            "zoology",
+            "botany",
+        ]:
+            raise ValueError("Invalid subject")
+        return v
+
+    @pydantic.field_validator("exam")
+    @classmethod
+    def validate_exam(cls, v):
+        if v is not None and v not in ["jee", "neet"]:
+            raise ValueError("Invalid exam")
+        return v
+
+
+class BulkSelectionForm(pydantic.BaseModel):
+    problem_ids: list[str] | None = None
+    filters: ProblemFilterForm | None = None
+
+    @pydantic.field_validator("problem_ids")
+    @classmethod
+    def validate_problem_ids(cls, v):
+        try:
+            for problem_id in v or []:
+                convert_to_bson_id(problem_id)
+        except InvalidId:
+            raise ValueError("Invalid problem id")
+        return v
+
+    @pydantic.model_validator(mode="after")
+    @classmethod
+    def validate_selection(cls, values):
+        if (values.problem_ids is None) == (values.filters is None):
+            raise ValueError("Provide either problem_ids or filters")
+        if values.filters and not build_problem_query(**values.filters.model_dump()):
+            raise ValueError("Filters should not be empty")
+        return values
+
+    def query(self) -> dict:
+        return build_problem_query(**self.filters.model_dump())  # pyright: ignore
+
+
+class BulkUpdateForm(BulkSelectionForm):
+    update: ProblemUpdateForm
+
+
 @router.get("/", response_class=JSONResponse, status_code=status.HTTP_200_OK)
 async def get_problems_ep(
     request: Request,
@@ -92,10 +225,45 @@ async def get_problems_ep(
 ):
     problems = await get_problems(subject, type, difficulty, exam)
     return JSONResponse(
-        content={"problems": [(problem.model_dump()) for problem in problems]}
+        content={
+            "problems": [
+                (problem.model_dump(exclude={"correct_answers"}))
+                for problem in problems
+            ]
+        }
     )
 
 
+@router.post("/grade", response_class=JSONResponse, status_code=status.HTTP_200_OK)
+async def grade_problems_ep(request: Request, grade: GradeForm):
+    user_id = request.session.get("user_id")
+    try:
+        # Answer keys are only released to a logged-in user for what they attempted.
+        op = await grade_answers(
+            {x.problem_id: x.answers for x in grade.submissions},
+            reveal=bool(user_id),
+        )
+    except GradingError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    if op["void"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Problems not found: {', '.join(op['void'])}",
+        )
+    for result in op["results"]:
+        if result["attempted"]:
+            trending_handler.record(result["problem_id"], "attempt")
+    if user_id:
+        await enqueue(
+            "attempts",
+            record_graded_attempts,
+            user_id,
+            op["results"],
+            str(ObjectId()),
+        )
+    return JSONResponse(content=op)
+
+
 @router.post(
     "/",
     response_class=JSONResponse,
@@ -103,8 +271,72 @@ async def get_problems_ep(
     dependencies=[Depends(is_admin)],
 )
 async def add_problem_ep(request: Request, problem: ProblemsForm):
-    op = await create_problem(**problem.model_dump())
-    return JSONResponse(content={"message": f"Problem added with ID: {op}"})
+    minhash = signature(problem.question)
+    duplicates = find_duplicates(minhash)
+    op = await create_problem(**problem.model_dump(), minhash=minhash)
+    index_problem(str(op), **problem.model_dump(include=set(INDEXED_FIELDS)))
+    index_question(str(op), minhash)
+    return JSONResponse(
+        content={
+            "message": f"Problem added with ID: {op}",
+            "duplicates": duplicates,
+        }
+    )
+
+
+@router.patch(
+    "/bulk",
+    response_class=JSONResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(is_admin)],
+)
+async def bulk_update_problems_ep(request: Request, form: BulkUpdateForm):
+    fields = form.update.model_dump(exclude_none=True)
+    if not fields:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Nothing to update.",
+        )
+    problem_ids = form.problem_ids
+    if problem_ids is None:
+        problem_ids = await get_problem_ids(form.query())
+    op = await update_problems(problem_ids, **fields)
+    for problem_id in problem_ids:
+        reindex_problem(problem_id, **fields)
+    return JSONResponse(content={"message": f"Updated {op} problems"})
+
+
+@router.post(
+    "/bulk/delete",
+    response_class=JSONResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(is_admin)],
+)
+async def bulk_delete_problems_ep(request: Request, form: BulkSelectionForm):
+    problem_ids = form.problem_ids
+    if problem_ids is None:
+        problem_ids = await get_problem_ids(form.query())
+    op = await delete_problems(problem_ids)
+    for problem_id in problem_ids:
+        unindex_problem(problem_id)
+        unindex_question(problem_id)
+    trending_handler.forget(problem_ids)
+    await enqueue("comment_cascade", delete_problem_comments, problem_ids)
+    return JSONResponse(content={"message": f"Deleted {op} problems"})
+
+
+@router.post(
+    "/bulk/sweep-comments",
+    response_class=JSONResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(is_admin)],
+)
+async def sweep_comments_ep(request: Request):
+    await enqueue("sweep", sweep_orphan_comments)
+    return JSONResponse(
+        content={"message": "Orphaned comment sweep started"},
+        status_code=status.HTTP_202_ACCEPTED,
+    )
 
 
 @router.patch(
@@ -114,8 +346,109 @@ async def add_problem_ep(request: Request, problem: ProblemsForm):
     dependencies=[Depends(is_admin)],
 )
 async def update_problem_ep(request: Request, problem_id: str, problem: ProblemsForm):
-    op = await update_problem(problem_id, **problem.model_dump())
-    return JSONResponse(content={"message": f"Problem updated with ID: {op}"})
+    minhash = signature(problem.question)
+    op = await update_problem(problem_id, **problem.model_dump(), minhash=minhash)
+    if not op:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Problem not found."
+        )
+    index_problem(problem_id, **problem.model_dump(include=set(INDEXED_FIELDS)))
+    index_question(problem_id, minhash)
+    return JSONResponse(
+        content={
+            "message": f"Problem updated with ID: {op}",
+            "duplicates": find_duplicates(minhash, exclude=problem_id),
+        }
+    )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(is_admin)],
+)
+async def export_problems_ep(
+    request: Request,
+    format: str = "ndjson",
+    gzip: bool = False,
+    subject: str | None = None,
+    type: str | None = None,
+    difficulty: str | None = None,
+    exam: str | None = None,
+):
+    if format not in ["ndjson", "csv"]:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Format should be ndjson or csv.",
+        )
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"problems.{format}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    return StreamingResponse(
+        export_problems(
+            build_problem_query(subject, type, difficulty, exam), format, gzip
+        ),
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+@router.get(
+    "/duplicates",
+    response_class=JSONResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(is_admin)],
+)
+async def duplicate_problems_ep(request: Request):
+    return JSONResponse(content={"clusters": duplicate_clusters()})
+
+
+@router.get("/changes", response_class=JSONResponse, status_code=status.HTTP_200_OK)
+async def problem_changes_ep(
+    request: Request,
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=500, ge=1, le=5000),
+):
+    op = await get_problem_changes(since, limit, SYNC_SETTLE)
+    return JSONResponse(
+        content={
+            **op,
+            "problems": [
+                problem.model_dump(exclude={"correct_answers"})
+                for problem in op["problems"]
+            ],
+        }
+    )
+
+
+@router.get("/trending", response_class=JSONResponse, status_code=status.HTTP_200_OK)
+async def trending_problems_ep(
+    request: Request,
+    count: int = Query(default=10, ge=1, le=trending_handler.TOP_K),
+):
+    return JSONResponse(content={"problems": trending_handler.trending(count)})
+
+
+@router.get(
+    "/recommended",
+    response_class=JSONResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(is_logged_in)],
+)
+async def recommended_problems_ep(
+    request: Request,
+    count: int = Query(default=10, ge=1, le=50),
+    exam: str | None = None,
+    subject: str | None = None,
+):
+    problems = await recommend_for_user(
+        request.session["user_id"], count, exam, subject
+    )
+    return JSONResponse(content={"problems": problems})
 
 
 @router.get(
@@ -123,7 +456,10 @@ async def update_problem_ep(request: Request, problem_id: str, problem: Problems
 )
 async def get_problem_ep(request: Request, problem_id: str):
     problem = await get_problem(problem_id)
-    return JSONResponse(content={"problem": (problem.model_dump())})
+    trending_handler.record(problem_id, "view")
+    return JSONResponse(
+        content={"problem": (problem.model_dump(exclude={"correct_answers"}))}
+    )
 
 
 @router.delete(
@@ -134,3 +470,7 @@ async def get_problem_ep(request: Request, problem_id: str):
 )
 async def delete_problem_ep(request: Request, problem_id: str):
     op = await delete_problem(problem_id)
+    unindex_problem(problem_id)
+    unindex_question(problem_id)
+    trending_handler.forget([problem_id])
+    await enqueue("comment_cascade", delete_problem_comments, [problem_id])
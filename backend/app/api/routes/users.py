@@ -0,0 +1,38 @@
+import logging
+from dotenv import load_dotenv, find_dotenv
+from fastapi import APIRouter, HTTPException, status, Request, Depends
+from fastapi.responses import JSONResponse
+from bson.errors import InvalidId
+from ..utils.database_handler import get_user_stats, rebuild_user_stats
+from ..utils.session_handler import is_admin
+from ..utils.task_handler import enqueue
+
+load_dotenv(find_dotenv())
+
+router = APIRouter(prefix="/users", tags=["users"])
+logger = logging.getLogger(__name__)
+
+
+@router.post(
+    "/stats/rebuild",
+    response_class=JSONResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(is_admin)],
+)
+async def rebuild_stats_ep(request: Request):
+    await enqueue("stats_rebuild", rebuild_user_stats)
+    return JSONResponse(
+        content={"message": "Stats rebuild started"},
+        status_code=status.HTTP_202_ACCEPTED,
+    )
+
+
+@router.get(
+    "/{user_id}/stats", response_class=JSONResponse, status_code=status.HTTP_200_OK
+)
+async def get_user_stats_ep(request: Request, user_id: str):
+    try:
+        stats = await get_user_stats(user_id)
+    except InvalidId:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return JSONResponse(content={"stats": stats.model_dump()})
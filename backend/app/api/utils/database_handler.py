@@ -2,12 +2,15 @@ import os
 import asyncio
 import logging
 import pydantic
-from pymongo import errors
+from typing import AsyncIterator, Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from pymongo import errors, ReplaceOne, UpdateOne, DeleteMany, ReturnDocument
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
 from dotenv import load_dotenv, find_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
 from email_validator import validate_email, EmailNotValidError
+from .profile_handler import profiled
 
 load_dotenv(find_dotenv())
 
@@ -15,13 +18,21 @@ connection_str = os.environ["MONGO_CONNECTION_STR"]
 client = None
 logger = logging.getLogger(__name__)
 
+BULK_BATCH_SIZE = 1000
+STATS_BATCHES = 20  # attempt batch ids remembered per user to skip retries
+
+# Write times used by delta sync come from the Mongo server's clock, so that
+# clock skew between app servers cannot break the settle window.
+NOW = {"updated_at": True}
+
 
 async def open_db() -> None:
-    global client, users_db, problems_db, comments_db
+    global client, users_db, problems_db, comments_db, exams_db
     client = AsyncIOMotorClient(connection_str)
     users_db = client.users
     problems_db = client.problems
     comments_db = client.comments
+    exams_db = client.exams
 
 
 async def close_db() -> None:
@@ -40,6 +51,79 @@ def switch_id_to_pydantic(data: dict) -> dict:
     return data
 
 
+def batched(items: list, size: int = BULK_BATCH_SIZE) -> list[list]:
+    """Splits a list into chunks of at most size items."""
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+class Loader:
+    """
+    Coalesces lookups by id into one $in query per event loop tick.
+
+    Every load made in the same tick, by one request or many, is fetched
+    together. Loads for an id that is already being fetched share that fetch,
+    which may have been sent before a write that has since landed; writers
+    call clear so that later loads fetch the id again.
+    """
+
+    def __init__(self, fetch: Callable[[list[ObjectId]], Awaitable[list[dict]]]):
+        self.fetch = fetch
+        self.queued: dict[ObjectId, asyncio.Future] = {}
+        self.inflight: dict[ObjectId, asyncio.Future] = {}
+        # The event loop only keeps weak references to tasks.
+        self.tasks: set[asyncio.Task] = set()
+
+    async def load(self, key: ObjectId) -> dict | None:
+        future = self.queued.get(key) or self.inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self.queued:
+                loop.call_soon(self._dispatch)
+            future = self.queued[key] = loop.create_future()
+        document = await asyncio.shield(future)
+        # Every waiter gets its own copy, since callers reshape the document.
+        return dict(document) if document else None
+
+    def clear(self, *keys: ObjectId) -> None:
+        """Stops later loads of the keys from sharing a fetch already sent."""
+        for key in keys:
+            self.inflight.pop(key, None)
+
+    def _dispatch(self) -> None:
+        batch, self.queued = self.queued, {}
+        self.inflight.update(batch)
+        task = asyncio.create_task(self._run(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, batch: dict[ObjectId, asyncio.Future]) -> None:
+        try:
+            documents = await self.fetch(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+            return
+        finally:
+            for key, future in batch.items():
+                if self.inflight.get(key) is future:
+                    del self.inflight[key]
+        found = {document["_id"]: document for document in documents}
+        for key, future in batch.items():
+            future.set_result(found.get(key))
+
+
+def _find_by_ids(collection: Callable) -> Callable:
+    async def fetch(ids: list[ObjectId]) -> list[dict]:
+        return await collection().find({"_id": {"$in": ids}}).to_list(None)
+
+    return fetch
+
+
+problem_loader = Loader(_find_by_ids(lambda: problems_db.problems))
+user_loader = Loader(_find_by_ids(lambda: users_db.auth_details))
+comment_loader = Loader(_find_by_ids(lambda: comments_db.comments))
+
+
 class ProblemModel(pydantic.BaseModel):
     id: str
 
@@ -168,215 +252,267 @@ class CommentModel(pydantic.BaseModel):
     model_config = {"arbitrary_types_allowed": True}
 
 
-async def create_user_db() -> None:
-    await client.drop_database("users")  # pyright: ignore
-    auth_validator = {
-        "$jsonSchema": {
-            "bsonType": "object",
-            "required": ["username", "email", "is_google"],
-            "properties": {
-                "username": {
-                    "bsonType": "string",
-                    "description": "Username of the user",
-                },
-                "email": {
-                    "bsonType": "string",
-                    "description": "Email of the user",
-                },
-                "profile_picture": {
-                    "bsonType": "string",
-                    "description": "Profile picture path of the user",
-                },
-                "problems": {
-                    "bsonType": "object",
-                    "description": "Object containing all problem related data of the user",
-                    "properties": {
-                        "problems_solved": {
-                            "bsonType": "array",
-                            "description": "List of ids of problems solved by the user",
-                            "items": {
-                                "bsonType": "objectId",
-                            },
-                        },
-                        "problems_attempted": {
-                            "bsonType": "array",
-                            "description": "List of ids of problems attempted by the user",
-                            "items": {
-                                "bsonType": "objectId",
-                            },
-                        },
-                        "problems_bookmarked": {
-                            "bsonType": "array",
-                            "description": "List of ids of problems bookmarked by the user",
-                            "items": {
-                                "bsonType": "objectId",
-                            },
+class ExamSessionModel(pydantic.BaseModel):
+    id: str
+    user: str
+    exam: str
+    problems: list[str]
+    responses: dict[str, list[str]] = {}
+    started_at: datetime
+    deadline: datetime
+    submitted: bool = False
+    result: dict | None = None
+
+    @pydantic.field_validator("id")
+    @classmethod
+    def validate_id(cls, v):
+        try:
+            ObjectId(v)
+        except InvalidId:
+            raise ValueError("Invalid id")
+        return v
+
+    model_config = {"arbitrary_types_allowed": True}
+
+
+AUTH_VALIDATOR = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["username", "email", "is_google"],
+        "properties": {
+            "username": {
+                "bsonType": "string",
+                "description": "Username of the user",
+            },
+            "email": {
+                "bsonType": "string",
+                "description": "Email of the user",
+            },
+            "profile_picture": {
+                "bsonType": "string",
+                "description": "Profile picture path of the user",
+            },
+            "problems": {
+                "bsonType": "object",
+                "description": "Object containing all problem related data of the user",
+                "properties": {
+                    "problems_solved": {
+                        "bsonType": "array",
+                        "description": "List of ids of problems solved by the user",
+                        "items": {
+                            "bsonType": "objectId",
                         },
                     },
-                },
-                "ranking": {
-                    "bsonType": "object",
-                    "description": "Object containing ranking related data of the user",
-                    "properties": {
-                        "rating": {
-                            "bsonType": "int",
-                            "description": "Rating of the user",
-                        },
-                        "rank": {
-                            "bsonType": "int",
-                            "description": "Rank of the user",
+                    "problems_attempted": {
+                        "bsonType": "array",
+                        "description": "List of ids of problems attempted by the user",
+                        "items": {
+                            "bsonType": "objectId",
                         },
                     },
-                },
-                "is_google": {
-                    "bsonType": "bool",
-                    "description": "True if the user is registered using Google",
-                },
-                "google_data": {
-                    "bsonType": "object",
-                    "description": "Object containing Google related data of the user",
-                    "properties": {
-                        "google_id": {
-                            "bsonType": "string",
-                            "description": "Google account ID of the user",
-                        },
-                        "access_token": {
-                            "bsonType": "string",
-                            "description": "Access token of the user",
-                        },
-                        "refresh_token": {
-                            "bsonType": "string",
-                            "description": "Refresh token of the user",
+                    "problems_bookmarked": {
+                        "bsonType": "array",
+                        "description": "List of ids of problems bookmarked by the user",
+                        "items": {
+                            "bsonType": "objectId",
                         },
                     },
                 },
             },
-        },
-    }
-
-    try:
-        await users_db.create_collection("auth_details")
-    except Exception as e:
-        logger.error(e)
-    logger.info("Collection created successfully")
-
-    await users_db.command("collMod", "auth_details", validator=auth_validator)
-
-    await users_db.auth_details.create_index("username", unique=True)
-    await users_db.auth_details.create_index("email", unique=True)
-    logger.info("Username and Email index created successfully")
-
-
-async def create_problems_db() -> None:
-    await client.drop_database("problems")  # pyright: ignore
-    problems_validator = {
-        "$jsonSchema": {
-            "bsonType": "object",
-            "required": [
-                "exam",
-                "difficulty",
-                "type",
-                "subject",
-                "category",
-                "question",
-                "options",
-                "correct_answers",
-            ],
-            "properties": {
-                "exam": {
-                    "bsonType": "string",
-                    "description": "Exam for which the problem is",
-                },
-                "difficulty": {
-                    "bsonType": "string",
-                    "description": "Difficulty level of the problem",
-                },
-                "type": {
-                    "bsonType": "string",
-                    "description": "Type of the problem",
-                },
-                "subject": {
-                    "bsonType": "string",
-                    "description": "Subject of the problem",
-                },
-                "category": {
-                    "bsonType": "string",
-                    "description": "Category of the problem",
-                },
-                "question": {
-                    "bsonType": "string",
-                    "description": "Question of the problem",
+            "ranking": {
+                "bsonType": "object",
+                "description": "Object containing ranking related data of the user",
+                "properties": {
+                    "rating": {
+                        "bsonType": "int",
+                        "description": "Rating of the user",
+                    },
+                    "rank": {
+                        "bsonType": "int",
+                        "description": "Rank of the user",
+                    },
                 },
-                "options": {
-                    "bsonType": "array",
-                    "description": "Options of the problem",
-                    "items": {
+            },
+            "is_google": {
+                "bsonType": "bool",
+                "description": "True if the user is registered using Google",
+            },
+            "google_data": {
+                "bsonType": "object",
+                "description": "Object containing Google related data of the user",
+                "properties": {
+                    "google_id": {
                         "bsonType": "string",
+                        "description": "Google account ID of the user",
                     },
-                },
-                "correct_answers": {
-                    "bsonType": "array",
-                    "description": "Correct answers of the problem",
-                    "items": {
+                    "access_token": {
                         "bsonType": "string",
+                        "description": "Access token of the user",
                     },
-                },
-                "comments": {
-                    "bsonType": "array",
-                    "description": "Comments on the problem",
-                    "items": {
-                        "bsonType": "objectId",
+                    "refresh_token": {
+                        "bsonType": "string",
+                        "description": "Refresh token of the user",
                     },
                 },
             },
         },
-    }
-
-    try:
-        await problems_db.create_collection("problems")
-    except Exception as e:
-        logger.error(e)
-    logger.info("Collection created successfully")
-
-    await problems_db.command("collMod", "problems", validator=problems_validator)
-
-
-async def create_comments_db() -> None:
-    await client.drop_database("comments")  # pyright: ignore
-    comments_validator = {
-        "$jsonSchema": {
-            "bsonType": "object",
-            "required": ["user", "comment", "problem"],
-            "properties": {
-                "user": {
-                    "bsonType": "objectId",
-                    "description": "User who commented",
+    },
+}
+
+
+PROBLEMS_VALIDATOR = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": [
+            "exam",
+            "difficulty",
+            "type",
+            "subject",
+            "category",
+            "question",
+            "options",
+            "correct_answers",
+        ],
+        "properties": {
+            "exam": {
+                "bsonType": "string",
+                "description": "Exam for which the problem is",
+            },
+            "difficulty": {
+                "bsonType": "string",
+                "description": "Difficulty level of the problem",
+            },
+            "type": {
+                "bsonType": "string",
+                "description": "Type of the problem",
+            },
+            "subject": {
+                "bsonType": "string",
+                "description": "Subject of the problem",
+            },
+            "category": {
+                "bsonType": "string",
+                "description": "Category of the problem",
+            },
+            "question": {
+                "bsonType": "string",
+                "description": "Question of the problem",
+            },
+            "options": {
+                "bsonType": "array",
+                "description": "Options of the problem",
+                "items": {
+                    "bsonType": "string",
                 },
-                "comment": {
+            },
+            "correct_answers": {
+                "bsonType": "array",
+                "description": "Correct answers of the problem",
+                "items": {
                     "bsonType": "string",
-                    "description": "Comment by the user",
                 },
-                "problem": {
+            },
+            "comments": {
+                "bsonType": "array",
+                "description": "Comments on the problem",
+                "items": {
                     "bsonType": "objectId",
-                    "description": "Problem on which the comment is",
-                },
-                "likes": {
-                    "bsonType": "int",
-                    "description": "Likes on the comment",
                 },
             },
+            "version": {
+                "bsonType": ["int", "long"],
+                "description": "Sync version of the last write to the problem",
+            },
+            "updated_at": {
+                "bsonType": "date",
+                "description": "Time of the last write to the problem",
+            },
+            "minhash": {
+                "bsonType": "binData",
+                "description": "MinHash signature of the question",
+            },
         },
-    }
+    },
+}
+
+
+COMMENTS_VALIDATOR = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["user", "comment", "problem"],
+        "properties": {
+            "user": {
+                "bsonType": "objectId",
+                "description": "User who commented",
+            },
+            "comment": {
+                "bsonType": "string",
+                "description": "Comment by the user",
+            },
+            "problem": {
+                "bsonType": "objectId",
+                "description": "Problem on which the comment is",
+            },
+            "likes": {
+                "bsonType": "int",
+                "description": "Likes on the comment",
+            },
+        },
+    },
+}
 
-    try:
-        await comments_db.create_collection("comments")
-    except Exception as e:
-        logger.error(e)
-    logger.info("Collection created successfully")
 
-    await comments_db.command("collMod", "comments", validator=comments_validator)
+@profiled
+async def ensure_collection(db: str, name: str, validator: dict) -> None:
+    """Creates a collection, or updates its validator in place keeping its data."""
+    database = client[db]  # pyright: ignore
+    if name not in await database.list_collection_names():
+        try:
+            await database.create_collection(name, validator=validator)
+            return
+        except errors.CollectionInvalid:
+            pass  # Created by another worker applying the same migration.
+        except errors.OperationFailure as e:
+            if e.code != 48:  # NamespaceExists
+                raise
+    await database.command("collMod", name, validator=validator)
+
+
+@profiled
+async def ensure_index(db: str, name: str, keys, **kwargs) -> str:
+    """Creates an index if it does not exist yet."""
+    return await client[db][name].create_index(keys, **kwargs)  # pyright: ignore
+
+
+@profiled
+async def insert_documents(db: str, name: str, documents: list[dict]) -> int:
+    """Inserts raw documents in bulk, still checked by the collection validator."""
+    result = await client[db][name].insert_many(  # pyright: ignore
+        documents, ordered=False
+    )
+    return len(result.inserted_ids)
+
+
+@profiled
+async def get_applied_migrations() -> set[int]:
+    """Gets the versions of all migrations applied so far."""
+    migrations = client.meta.migrations.find({}, {"_id": 1})  # pyright: ignore
+    return {migration["_id"] async for migration in migrations}
+
+
+@profiled
+async def record_migration(version: int, description: str) -> None:
+    """Records that a migration has been applied."""
+    await client.meta.migrations.insert_one(  # pyright: ignore
+        {
+            "_id": version,
+            "description": description,
+            "applied_at": datetime.now(timezone.utc),
+        }
+    )
 
 
+@profiled
 async def create_google_user(
     username: str, email: str, profile_picture: str, google_data: dict
 ) -> bool:
@@ -396,14 +532,13 @@ async def create_google_user(
         return False
 
 
+@profiled
 async def get_user_by_id(user_id: str, is_google_id: bool = False) -> UserModel:
     """Gets a user by their id."""
     if is_google_id:
         user = await users_db.auth_details.find_one({"google_data.google_id": user_id})
     else:
-        user = await users_db.auth_details.find_one(
-            {"_id": convert_to_bson_id(user_id)}
-        )
+        user = await user_loader.load(convert_to_bson_id(user_id))
     if not user:
         raise ValueError("User not found")
     op = switch_id_to_pydantic(user)
@@ -411,15 +546,34 @@ async def get_user_by_id(user_id: str, is_google_id: bool = False) -> UserModel:
     return UserModel(**op)
 
 
+@profiled
 async def update_user_session(user_id: str, access_token: str) -> bool:
     """Updates the session data of a user."""
     await users_db.auth_details.update_one(
         {"_id": convert_to_bson_id(user_id)},
         {"$set": {"google_data.access_token": access_token}},
     )
+    user_loader.clear(convert_to_bson_id(user_id))
     return True
 
 
+@profiled
+async def reserve_versions(count: int = 1) -> int:
+    """
+    Reserves a block of problem sync versions and returns the first one.
+
+    Versions come from a shared counter, so they increase across all workers.
+    """
+    counter = await client.meta.counters.find_one_and_update(  # pyright: ignore
+        {"_id": "problems"},
+        {"$inc": {"version": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["version"] - count + 1
+
+
+@profiled
 async def create_problem(
     exam: str,
     difficulty: str,
@@ -430,8 +584,9 @@ async def create_problem(
     correct_answers: list[str],
     options: list[str] = [],
     comments: list[str] = [],
+    minhash: bytes | None = None,
 ) -> ObjectId:
-    """Creates a problem."""
+    """Creates a problem, with its duplicate detection signature if given."""
     problem = {
         "exam": exam,
         "difficulty": difficulty,
@@ -442,18 +597,37 @@ async def create_problem(
         "options": options,
         "correct_answers": correct_answers,
         "comments": [convert_to_bson_id(comment) for comment in comments],
+        "version": await reserve_versions(),
     }
-    result = await problems_db.problems.insert_one(problem)
-    return result.inserted_id
+    if minhash:
+        problem["minhash"] = minhash
+    result = await problems_db.problems.update_one(
+        {"_id": ObjectId()},
+        {"$setOnInsert": problem, "$currentDate": NOW},
+        upsert=True,
+    )
+    return result.upserted_id
 
 
-async def get_problems(
+async def iter_problems(
+    query: dict, batch_size: int = BULK_BATCH_SIZE
+) -> AsyncIterator[dict]:
+    """Streams raw problems matching a query straight from the cursor."""
+    problems = problems_db.problems.find(query, {"minhash": 0}, batch_size=batch_size)
+    async for problem in problems:
+        problem["comments"] = [str(comment) for comment in problem.get("comments", [])]
+        if "updated_at" in problem:
+            problem["updated_at"] = problem["updated_at"].isoformat()
+        yield switch_id_to_pydantic(problem)
+
+
+def build_problem_query(
     subject: str | None = None,
     type: str | None = None,
     difficulty: str | None = None,
     exam: str | None = None,
-) -> list[ProblemModel]:
-    """Gets problems based on the filters. All problems if no filters are provided."""
+) -> dict:
+    """Builds a problems query from the filters that are set."""
     query = {}
     if subject:
         query["subject"] = subject
@@ -463,40 +637,310 @@ async def get_problems(
         query["difficulty"] = difficulty
     if exam:
         query["exam"] = exam
+    return query
+
+
+@profiled
+async def get_problems(
+    subject: str | None = None,
+    type: str | None = None,
+    difficulty: str | None = None,
+    exam: str | None = None,
+) -> list[ProblemModel]:
+    """Gets problems based on the filters. All problems if no filters are provided."""
+    query = build_problem_query(subject, type, difficulty, exam)
     problems = problems_db.problems.find(query)
     op = [switch_id_to_pydantic(problem) async for problem in problems]
     return [ProblemModel(**problem) for problem in op]
 
 
+@profiled
 async def update_problem(problem_id: str, **kwargs) -> bool:
-    """Updates a problem."""
+    """Updates a problem. Returns False if it does not exist."""
     comments = kwargs.get("comments")
     if comments:
         kwargs["comments"] = [convert_to_bson_id(comment) for comment in comments]
+    kwargs["version"] = await reserve_versions()
 
-    await problems_db.problems.update_one(
-        {"_id": convert_to_bson_id(problem_id)}, {"$set": kwargs}
+    result = await problems_db.problems.update_one(
+        {"_id": convert_to_bson_id(problem_id)},
+        {"$set": kwargs, "$currentDate": NOW},
     )
-    return True
+    problem_loader.clear(convert_to_bson_id(problem_id))
+    return result.matched_count == 1
+
+
+@profiled
+async def get_problem_ids(query: dict) -> list[str]:
+    """Gets the ids of all problems matching a query."""
+    problems = problems_db.problems.find(query, {"_id": 1})
+    return [str(problem["_id"]) async for problem in problems]
+
+
+@profiled
+async def update_problems(problem_ids: list[str], **kwargs) -> int:
+    """Updates many problems in one bulk write, giving each its own sync version."""
+    ids = [convert_to_bson_id(problem_id) for problem_id in problem_ids]
+    if not ids:
+        return 0
+    first = await reserve_versions(len(ids))
+    modified = 0
+    for start, batch in zip(range(0, len(ids), BULK_BATCH_SIZE), batched(ids)):
+        requests = [
+            UpdateOne(
+                {"_id": x},
+                {"$set": {**kwargs, "version": first + start + i}, "$currentDate": NOW},
+            )
+            for i, x in enumerate(batch)
+        ]
+        result = await problems_db.problems.bulk_write(requests, ordered=False)
+        modified += result.modified_count
+    problem_loader.clear(*ids)
+    return modified
+
+
+async def iter_problem_fields(fields: list[str]) -> AsyncIterator[dict]:
+    """Streams the id and the given fields of every problem."""
+    problems = problems_db.problems.find(
+        {}, {field: 1 for field in fields}, batch_size=BULK_BATCH_SIZE
+    )
+    async for problem in problems:
+        yield switch_id_to_pydantic(problem)
+
+
+@profiled
+async def get_problem_questions(problem_ids: list[str]) -> dict[str, str]:
+    """Gets the questions of many problems in a single query."""
+    ids = [convert_to_bson_id(problem_id) for problem_id in problem_ids]
+    problems = problems_db.problems.find({"_id": {"$in": ids}}, {"question": 1})
+    return {str(problem["_id"]): problem["question"] async for problem in problems}
+
+
+@profiled
+async def set_problem_signatures(signatures: dict[str, bytes]) -> None:
+    """Stores the duplicate detection signatures of many problems in bulk."""
+    requests = [
+        UpdateOne({"_id": convert_to_bson_id(x)}, {"$set": {"minhash": sig}})
+        for x, sig in signatures.items()
+    ]
+    for batch in batched(requests):
+        await problems_db.problems.bulk_write(batch, ordered=False)
 
 
+@profiled
 async def get_problem(problem_id: str) -> ProblemModel:
     """Gets a problem by its id."""
-    problem = await problems_db.problems.find_one(
-        {"_id": convert_to_bson_id(problem_id)}
-    )
+    problem = await problem_loader.load(convert_to_bson_id(problem_id))
     if not problem:
         raise ValueError("Problem not found")
     op = switch_id_to_pydantic(problem)
     return ProblemModel(**op)
 
 
+@profiled
+async def get_answer_keys(problem_ids: list[str]) -> dict[str, dict]:
+    """Gets the answer keys and categorisation of many problems in a single query."""
+    ids = [convert_to_bson_id(problem_id) for problem_id in problem_ids]
+    problems = problems_db.problems.find(
+        {"_id": {"$in": ids}},
+        {
+            "type": 1,
+            "correct_answers": 1,
+            "subject": 1,
+            "category": 1,
+            "difficulty": 1,
+        },
+    )
+    return {str(problem.pop("_id")): problem async for problem in problems}
+
+
+@profiled
+async def get_problems_by_ids(problem_ids: list[str]) -> list[ProblemModel]:
+    """Gets many problems by their ids in a single query, keeping the given order."""
+    ids = [convert_to_bson_id(problem_id) for problem_id in problem_ids]
+    problems = problems_db.problems.find({"_id": {"$in": ids}})
+    op = {problem["_id"]: switch_id_to_pydantic(problem) async for problem in problems}
+    return [ProblemModel(**op[x]) for x in ids if x in op]
+
+
+@profiled
+async def get_random_problem_ids(
+    exam: str, count: int, subject: str | None = None
+) -> list[str]:
+    """Gets the ids of randomly sampled problems for an exam."""
+    query = {"exam": exam}
+    if subject:
+        query["subject"] = subject
+    problems = problems_db.problems.aggregate(
+        [{"$match": query}, {"$sample": {"size": count}}, {"$project": {"_id": 1}}]
+    )
+    # $sample can return the same document more than once.
+    return list(dict.fromkeys([str(problem["_id"]) async for problem in problems]))
+
+
+@profiled
 async def delete_problem(problem_id: str) -> bool:
-    """Deletes a problem."""
-    await problems_db.problems.delete_one({"_id": convert_to_bson_id(problem_id)})
+    """Deletes a problem. Its comments are removed by delete_problem_comments."""
+    await delete_problems([problem_id])
     return True
 
 
+@profiled
+async def delete_problems(problem_ids: list[str]) -> int:
+    """Deletes many problems in bulk, leaving tombstones for delta sync."""
+    ids = [convert_to_bson_id(problem_id) for problem_id in problem_ids]
+    existing = problems_db.problems.find({"_id": {"$in": ids}}, {"_id": 1})
+    ids = [problem["_id"] async for problem in existing]
+    if not ids:
+        return 0
+    result = await problems_db.problems.bulk_write(
+        [DeleteMany({"_id": {"$in": batch}}) for batch in batched(ids)],
+        ordered=False,
+    )
+    problem_loader.clear(*ids)
+    # Tombstones are only left for problems that existed and are now gone.
+    first = await reserve_versions(len(ids))
+    await problems_db.tombstones.bulk_write(
+        [
+            UpdateOne(
+                {"_id": x},
+                {"$set": {"version": first + i}, "$currentDate": {"deleted_at": True}},
+                upsert=True,
+            )
+            for i, x in enumerate(ids)
+        ],
+        ordered=False,
+    )
+    await problems_db.trending.bulk_write(
+        [DeleteMany({"_id": {"$in": batch}}) for batch in batched(ids)],
+        ordered=False,
+    )
+    return result.deleted_count
+
+
+@profiled
+async def stamp_unversioned_problems(batch_size: int = BULK_BATCH_SIZE) -> int:
+    """Gives every problem without a sync version one, stamped in order."""
+    stamped = 0
+    while True:
+        problems = problems_db.problems.find(
+            {"version": {"$exists": False}}, {"_id": 1}
+        ).limit(batch_size)
+        ids = [problem["_id"] async for problem in problems]
+        if not ids:
+            return stamped
+        first = await reserve_versions(len(ids))
+        await problems_db.problems.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": x, "version": {"$exists": False}},
+                    {"$set": {"version": first + i}, "$currentDate": NOW},
+                )
+                for i, x in enumerate(ids)
+            ],
+            ordered=False,
+        )
+        stamped += len(ids)
+
+
+def _settled_page(changes: list[dict], limit: int) -> tuple[list[dict], bool]:
+    """
+    Cuts changes sorted by version off before the first one still settling.
+
+    Returns the page and whether more changes can be fetched straight away.
+    """
+    page = []
+    for change in changes[:limit]:
+        if not change.pop("_settled"):
+            return page, False
+        page.append(change)
+    return page, len(changes) > limit
+
+
+@profiled
+async def get_problem_changes(since: int, limit: int, settle: float) -> dict:
+    """
+    Gets problems written and deleted after a sync version, oldest first.
+
+    A version is reserved before its write lands, so a slow write can commit
+    after a newer one. The page therefore stops before the first write younger
+    than settle seconds, giving every older version time to land before any
+    newer one is handed out.
+    """
+
+    def pipeline(field: str) -> list[dict]:
+        # Compared against the server's clock, the same one that stamped the write.
+        cutoff = {"$subtract": ["$$NOW", int(settle * 1000)]}
+        return [
+            {"$match": {"version": {"$gt": since}}},
+            {"$sort": {"version": 1}},
+            {"$limit": limit + 1},
+            {"$project": {"minhash": 0}},
+            {"$addFields": {"_settled": {"$lt": [f"${field}", cutoff]}}},
+        ]
+
+    changed = problems_db.problems.aggregate(pipeline("updated_at"))
+    deleted = problems_db.tombstones.aggregate(pipeline("deleted_at"))
+    changes = await changed.to_list(None) + await deleted.to_list(None)
+    changes.sort(key=lambda x: x["version"])
+    page, has_more = _settled_page(changes, limit)
+
+    problems, deleted_ids = [], []
+    for change in page:
+        if "deleted_at" in change:
+            deleted_ids.append(str(change["_id"]))
+        else:
+            change.pop("updated_at")
+            problems.append(ProblemModel(**switch_id_to_pydantic(change)))
+    return {
+        "problems": problems,
+        "deleted": deleted_ids,
+        "version": page[-1]["version"] if page else since,
+        "has_more": has_more,
+    }
+
+
+@profiled
+async def delete_problem_comments(problem_ids: list[str]) -> int:
+    """Deletes all comments on the given problems."""
+    deleted = 0
+    ids = [convert_to_bson_id(problem_id) for problem_id in problem_ids]
+    for batch in batched(ids):
+        result = await comments_db.comments.delete_many({"problem": {"$in": batch}})
+        deleted += result.deleted_count
+    return deleted
+
+
+@profiled
+async def sweep_orphan_comments(batch_size: int = BULK_BATCH_SIZE) -> int:
+    """Deletes comments whose problem no longer exists, in batches of problems."""
+    deleted = 0
+    problems = comments_db.comments.aggregate(
+        [{"$group": {"_id": "$problem"}}], allowDiskUse=True, batchSize=batch_size
+    )
+    batch = []
+    async for problem in problems:
+        batch.append(problem["_id"])
+        if len(batch) >= batch_size:
+            deleted += await _delete_orphan_comments(batch)
+            batch = []
+    if batch:
+        deleted += await _delete_orphan_comments(batch)
+    logger.info(f"Swept {deleted} orphaned comments")
+    return deleted
+
+
+async def _delete_orphan_comments(problem_ids: list[ObjectId]) -> int:
+    existing = problems_db.problems.find({"_id": {"$in": problem_ids}}, {"_id": 1})
+    found = {problem["_id"] async for problem in existing}
+    orphans = [x for x in problem_ids if x not in found]
+    if not orphans:
+        return 0
+    result = await comments_db.comments.delete_many({"problem": {"$in": orphans}})
+    return result.deleted_count
+
+
+@profiled
 async def create_comment(user: str, comment: str, problem: str) -> ObjectId:
     """Creates a comment."""
     commentd = {
@@ -509,6 +953,7 @@ async def create_comment(user: str, comment: str, problem: str) -> ObjectId:
     return result.inserted_id
 
 
+@profiled
 async def get_comments(problem_id: str) -> list[CommentModel]:
     """Gets comments on a problem."""
     comments = comments_db.comments.find({"problem": convert_to_bson_id(problem_id)})
@@ -516,20 +961,25 @@ async def get_comments(problem_id: str) -> list[CommentModel]:
     return [CommentModel(**comment) for comment in op]
 
 
+@profiled
 async def like_comment(comment_id: str) -> bool:
     """Likes a comment."""
     await comments_db.comments.update_one(
         {"_id": convert_to_bson_id(comment_id)}, {"$inc": {"likes": 1}}
     )
+    comment_loader.clear(convert_to_bson_id(comment_id))
     return True
 
 
+@profiled
 async def delete_comment(comment_id: str) -> bool:
     """Deletes a comment."""
     await comments_db.comments.delete_one({"_id": convert_to_bson_id(comment_id)})
+    comment_loader.clear(convert_to_bson_id(comment_id))
     return True
 
 
+@profiled
 async def get_user_comments(user_id: str) -> list[CommentModel]:
     """Gets comments by a user."""
     comments = comments_db.comments.find({"user": convert_to_bson_id(user_id)})
@@ -537,28 +987,455 @@ async def get_user_comments(user_id: str) -> list[CommentModel]:
     return [CommentModel(**comment) for comment in op]
 
 
+@profiled
 async def get_comment(comment_id: str) -> CommentModel:
     """Gets a comment by its id."""
-    comment = await comments_db.comments.find_one(
-        {"_id": convert_to_bson_id(comment_id)}
-    )
+    comment = await comment_loader.load(convert_to_bson_id(comment_id))
     if not comment:
         raise ValueError("Comment not found")
     op = switch_id_to_pydantic(comment)
     return CommentModel(**op)
 
 
+@profiled
 async def dislike_comment(comment_id: str) -> bool:
     """Dislikes a comment."""
     await comments_db.comments.update_one(
         {"_id": convert_to_bson_id(comment_id)}, {"$inc": {"likes": -1}}
     )
+    comment_loader.clear(convert_to_bson_id(comment_id))
     return True
 
 
+@profiled
 async def update_comment(comment_id: str, **kwargs) -> bool:
     """Updates a comment."""
     await comments_db.comments.update_one(
         {"_id": convert_to_bson_id(comment_id)}, {"$set": kwargs}
     )
+    comment_loader.clear(convert_to_bson_id(comment_id))
     return True
+
+
+def _exam_session_to_bson(session: ExamSessionModel) -> dict:
+    data = session.model_dump()
+    data["_id"] = convert_to_bson_id(data.pop("id"))
+    data["user"] = convert_to_bson_id(data["user"])
+    return data
+
+
+@profiled
+async def create_exam_session(session: ExamSessionModel) -> None:
+    """Creates an exam session."""
+    await exams_db.sessions.insert_one(_exam_session_to_bson(session))
+
+
+@profiled
+async def save_exam_responses(responses: dict[str, dict[str, list[str]]]) -> None:
+    """
+    Checkpoints changed responses of many open exam sessions in one bulk write.
+
+    Only the given responses are set, so workers checkpointing the same session
+    do not overwrite each other. Submitted sessions are left untouched.
+    """
+    requests = [
+        UpdateOne(
+            {"_id": convert_to_bson_id(session_id), "submitted": False},
+            {"$set": {f"responses.{x}": answers for x, answers in changed.items()}},
+        )
+        for session_id, changed in responses.items()
+        if changed
+    ]
+    if requests:
+        await exams_db.sessions.bulk_write(requests, ordered=False)
+
+
+@profiled
+async def submit_exam_session(session: ExamSessionModel) -> bool:
+    """Stores a graded exam session, unless it has already been submitted."""
+    data = _exam_session_to_bson(session)
+    result = await exams_db.sessions.replace_one(
+        {"_id": data["_id"], "submitted": False}, data
+    )
+    return result.matched_count == 1
+
+
+def _exam_session_from_bson(session: dict) -> ExamSessionModel:
+    session["user"] = str(session["user"])
+    # Mongo hands back naive datetimes that are in UTC.
+    for key in ("started_at", "deadline"):
+        session[key] = session[key].replace(tzinfo=timezone.utc)
+    return ExamSessionModel(**switch_id_to_pydantic(session))
+
+
+@profiled
+async def get_exam_session(session_id: str) -> ExamSessionModel:
+    """Gets an exam session by its id."""
+    session = await exams_db.sessions.find_one({"_id": convert_to_bson_id(session_id)})
+    if not session:
+        raise ValueError("Exam session not found")
+    return _exam_session_from_bson(session)
+
+
+@profiled
+async def claim_expired_exam_sessions(
+    grader: str, cutoff: datetime, limit: int, timeout: float
+) -> list[ExamSessionModel]:
+    """
+    Claims up to limit unsubmitted sessions whose deadline passed before cutoff.
+
+    A claim older than timeout seconds is taken to be abandoned by a worker
+    that died, so it can be claimed again.
+    """
+    now = datetime.now(timezone.utc)
+    unclaimed = {
+        "submitted": False,
+        "deadline": {"$lte": cutoff},
+        "$or": [
+            {"grader": {"$exists": False}},
+            {"claimed_at": {"$lt": now - timedelta(seconds=timeout)}},
+        ],
+    }
+    expired = exams_db.sessions.find(unclaimed, {"_id": 1}).limit(limit)
+    ids = [session["_id"] async for session in expired]
+    if not ids:
+        return []
+    await exams_db.sessions.update_many(
+        {**unclaimed, "_id": {"$in": ids}},
+        {"$set": {"grader": grader, "claimed_at": now}},
+    )
+    claimed = exams_db.sessions.find({"_id": {"$in": ids}, "grader": grader})
+    return [_exam_session_from_bson(session) async for session in claimed]
+
+
+@profiled
+async def submit_exam_sessions(
+    sessions: list[ExamSessionModel], grader: str
+) -> list[str]:
+    """
+    Stores many graded sessions claimed by grader in one bulk write.
+
+    Returns the ids actually stored; a session submitted by its user or claimed
+    by another grader in the meantime is left as it is.
+    """
+    if not sessions:
+        return []
+    documents = [
+        {**_exam_session_to_bson(session), "grader": grader} for session in sessions
+    ]
+    await exams_db.sessions.bulk_write(
+        [
+            ReplaceOne({"_id": x["_id"], "submitted": False, "grader": grader}, x)
+            for x in documents
+        ],
+        ordered=False,
+    )
+    ids = [x["_id"] for x in documents]
+    stored = exams_db.sessions.find(
+        {"_id": {"$in": ids}, "grader": grader, "submitted": True}, {"_id": 1}
+    )
+    return [str(session["_id"]) async for session in stored]
+
+
+@profiled
+async def get_attempted_problem_ids(user_id: str) -> set[str]:
+    """Gets the ids of every problem a user has attempted."""
+    problems = await users_db.attempts.distinct(
+        "problem", {"user": convert_to_bson_id(user_id)}
+    )
+    return {str(problem) for problem in problems}
+
+
+def stat_key(name: str) -> str:
+    """Makes a subject or category name safe to use in a field path."""
+    return name.replace(".", "_").replace("$", "_")
+
+
+def _day_number(moment: datetime) -> int:
+    return moment.date().toordinal()
+
+
+def _streak_update(day: int) -> list[dict]:
+    return [
+        {
+            "$set": {
+                "current_streak": {
+                    "$switch": {
+                        "branches": [
+                            {
+                                "case": {"$eq": ["$last_active_day", day]},
+                                "then": "$current_streak",
+                            },
+                            {
+                                "case": {"$eq": ["$last_active_day", day - 1]},
+                                "then": {"$add": ["$current_streak", 1]},
+                            },
+                        ],
+                        "default": 1,
+                    }
+                }
+            }
+        },
+        {
+            "$set": {
+                "longest_streak": {
+                    "$max": [{"$ifNull": ["$longest_streak", 0]}, "$current_streak"]
+                },
+                "last_active_day": day,
+            }
+        },
+    ]
+
+
+@profiled
+async def record_attempts(user_id: str, attempts: list[dict], batch_id: str) -> None:
+    """
+    Records graded attempts and folds them into the user's stats document.
+
+    Each attempt needs problem_id, subject, category, difficulty and correct.
+    Recording a batch again is a no-op, so a failed batch can be retried.
+    """
+    if not attempts:
+        return
+    user = convert_to_bson_id(user_id)
+    now = datetime.now(timezone.utc)
+    day = _day_number(now)
+    try:
+        await users_db.attempts.insert_many(
+            [
+                {
+                    "_id": f"{batch_id}:{attempt['problem_id']}",
+                    "user": user,
+                    "problem": convert_to_bson_id(attempt["problem_id"]),
+                    "subject": attempt["subject"],
+                    "category": attempt["category"],
+                    "difficulty": attempt["difficulty"],
+                    "correct": attempt["correct"],
+                    "created_at": now,
+                    "day": day,
+                }
+                for attempt in attempts
+            ],
+            ordered=False,
+        )
+    except errors.BulkWriteError as e:
+        # Attempts already inserted by an earlier try of this batch.
+        if any(x["code"] != 11000 for x in e.details["writeErrors"]):
+            raise
+
+    inc: dict[str, int] = {}
+    for attempt in attempts:
+        subject = f"subjects.{stat_key(attempt['subject'])}"
+        category = f"{subject}.categories.{stat_key(attempt['category'])}"
+        for path in ("", f"{subject}.", f"{category}."):
+            inc[f"{path}attempts"] = inc.get(f"{path}attempts", 0) + 1
+            inc[f"{path}correct"] = inc.get(f"{path}correct", 0) + attempt["correct"]
+    counts = {
+        path: {"$add": [{"$ifNull": [f"${path}", 0]}, value]}
+        for path, value in inc.items()
+    }
+    # The last few batch ids are kept so a retried batch is only counted once.
+    batches = {
+        "$slice": [
+            {"$concatArrays": [{"$ifNull": ["$batches", []]}, [batch_id]]},
+            -STATS_BATCHES,
+        ]
+    }
+    try:
+        await users_db.stats.update_one(
+            {"_id": user, "batches": {"$ne": batch_id}},
+            [{"$set": {**counts, "batches": batches}}, *_streak_update(day)],
+            upsert=True,
+        )
+    except errors.DuplicateKeyError:
+        pass  # The stats already count this batch, so the upsert had no match.
+
+
+class AccuracyModel(pydantic.BaseModel):
+    attempts: int = 0
+    correct: int = 0
+
+    @pydantic.computed_field
+    @property
+    def accuracy(self) -> float:
+        return self.correct / self.attempts if self.attempts else 0.0
+
+
+class SubjectStatsModel(AccuracyModel):
+    categories: dict[str, AccuracyModel] = {}
+
+
+class UserStatsModel(AccuracyModel):
+    id: str
+    subjects: dict[str, SubjectStatsModel] = {}
+    current_streak: int = 0
+    longest_streak: int = 0
+    last_active_day: int | None = None
+
+
+@profiled
+async def get_user_stats(user_id: str) -> UserStatsModel:
+    """Gets the materialized stats of a user."""
+    stats = await users_db.stats.find_one({"_id": convert_to_bson_id(user_id)})
+    if not stats:
+        return UserStatsModel(id=user_id)
+    op = UserStatsModel(**switch_id_to_pydantic(stats))
+    # The stored streak is only bumped on activity, so it lapses on read.
+    yesterday = _day_number(datetime.now(timezone.utc)) - 1
+    if op.last_active_day and op.last_active_day < yesterday:
+        op.current_streak = 0
+    return op
+
+
+def _streaks(days: list[int]) -> tuple[int, int]:
+    longest = current = 0
+    previous = None
+    for day in sorted(days):
+        current = current + 1 if previous == day - 1 else 1
+        longest = max(longest, current)
+        previous = day
+    return current, longest
+
+
+def _build_stats(user: ObjectId, groups: list[dict]) -> dict:
+    stats = {"_id": user, "attempts": 0, "correct": 0, "subjects": {}}
+    days = set()
+    for group in groups:
+        subject = stats["subjects"].setdefault(
+            stat_key(group["_id"]["subject"]),
+            {"attempts": 0, "correct": 0, "categories": {}},
+        )
+        subject["categories"][stat_key(group["_id"]["category"])] = {
+            "attempts": group["attempts"],
+            "correct": group["correct"],
+        }
+        for target in (stats, subject):
+            target["attempts"] += group["attempts"]
+            target["correct"] += group["correct"]
+        days.update(group["days"])
+    stats["current_streak"], stats["longest_streak"] = _streaks(list(days))
+    stats["last_active_day"] = max(days) if days else None
+    return stats
+
+
+@profiled
+async def rebuild_user_stats(batch_size: int = BULK_BATCH_SIZE) -> int:
+    """Recomputes every stats document from the raw attempts in bulk."""
+    groups = users_db.attempts.aggregate(
+        [
+            {
+                "$group": {
+                    "_id": {
+                        "user": "$user",
+                        "subject": "$subject",
+                        "category": "$category",
+                    },
+                    "attempts": {"$sum": 1},
+                    "correct": {"$sum": {"$cond": ["$correct", 1, 0]}},
+                    "days": {"$addToSet": "$day"},
+                }
+            },
+            {"$sort": {"_id.user": 1}},
+        ],
+        allowDiskUse=True,
+        batchSize=batch_size,
+    )
+    rebuilt = 0
+    requests = []
+    user, pending = None, []
+
+    async def flush() -> None:
+        nonlocal rebuilt, requests
+        if requests:
+            await users_db.stats.bulk_write(requests, ordered=False)
+            rebuilt += len(requests)
+            requests = []
+
+    async for group in groups:
+        if pending and group["_id"]["user"] != user:
+            stats = _build_stats(user, pending)  # pyright: ignore
+            requests.append(ReplaceOne({"_id": user}, stats, upsert=True))
+            pending = []
+            if len(requests) >= batch_size:
+                await flush()
+        user = group["_id"]["user"]
+        pending.append(group)
+    if pending:
+        stats = _build_stats(user, pending)  # pyright: ignore
+        requests.append(ReplaceOne({"_id": user}, stats, upsert=True))
+    await flush()
+    logger.info(f"Rebuilt stats for {rebuilt} users")
+    return rebuilt
+
+
+def _decayed_score(now: float, half_life: int) -> dict:
+    elapsed = {"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}
+    return {
+        "$multiply": [
+            {"$ifNull": ["$score", 0]},
+            {"$pow": [0.5, {"$divide": [elapsed, half_life]}]},
+        ]
+    }
+
+
+@profiled
+async def merge_trending(deltas: list[dict], now: float, half_life: int) -> None:
+    """Merges decayed view and attempt counts from a worker in one bulk write."""
+    requests = [
+        UpdateOne(
+            {"_id": convert_to_bson_id(delta["id"])},
+            [
+                {
+                    "$set": {
+                        "score": {
+                            "$add": [_decayed_score(now, half_life), delta["score"]]
+                        },
+                        "views": {"$add": [{"$ifNull": ["$views", 0]}, delta["views"]]},
+                        "attempts": {
+                            "$add": [{"$ifNull": ["$attempts", 0]}, delta["attempts"]]
+                        },
+                        "updated_at": now,
+                    }
+                }
+            ],
+            upsert=True,
+        )
+        for delta in deltas
+    ]
+    for batch in batched(requests):
+        await problems_db.trending.bulk_write(batch, ordered=False)
+    # Anything untouched for 30 half-lives has decayed to nothing.
+    cutoff = now - 30 * half_life
+    await problems_db.trending.delete_many({"updated_at": {"$lt": cutoff}})
+
+
+@profiled
+async def get_trending(now: float, half_life: int, limit: int) -> list[dict]:
+    """Gets the top problems by decayed score, merged across all workers."""
+    problems = problems_db.trending.aggregate(
+        [
+            {"$set": {"score": _decayed_score(now, half_life)}},
+            {"$sort": {"score": -1}},
+            # Workers may still merge counts for a problem deleted elsewhere.
+            {
+                "$lookup": {
+                    "from": "problems",
+                    "localField": "_id",
+                    "foreignField": "_id",
+                    "pipeline": [{"$project": {"_id": 1}}],
+                    "as": "problem",
+                }
+            },
+            {"$match": {"problem": {"$ne": []}}},
+            {"$limit": limit},
+        ]
+    )
+    return [
+        {
+            "id": str(problem["_id"]),
+            "score": problem["score"],
+            "views": problem.get("views", 0),
+            "attempts": problem.get("attempts", 0),
+        }
+        async for problem in problems
+    ]
@@ -0,0 +1,192 @@
+import array, asyncio, logging, random, re, zlib
+from .database_handler import (
+    batched,
+    iter_problem_fields,
+    get_problem_questions,
+    set_problem_signatures,
+)
+
+logger = logging.getLogger(__name__)
+
+# MinHash signatures are split into BANDS bands of ROWS rows; two questions
+# become candidates when any band matches, which happens with good odds above
+# roughly (1 / BANDS) ** (1 / ROWS) ~= 0.77 Jaccard similarity.
+BANDS = 8
+ROWS = 8
+SHINGLE_SIZE = 3  # words per shingle
+THRESHOLD = 0.8  # estimated Jaccard similarity to count as a duplicate
+
+_SLOTS = BANDS * ROWS
+_PRIME = (1 << 61) - 1
+_MASK = 0xFFFFFFFF
+_random = random.Random(0)  # fixed seed so signatures are stable across restarts
+_a, _b, _offset = (_random.randrange(1, _PRIME) for _ in range(3))
+
+# Signatures are packed as _SLOTS unsigned 32 bit values and stored with each
+# problem, so the index is loaded rather than rehashed on startup. A band is
+# kept under the hash of its bytes, holding a single id or a set of them.
+signatures: dict[str, bytes] = {}
+bands: list[dict[int, str | set[str]]] = [{} for _ in range(BANDS)]
+
+
+def _shingles(question: str) -> set[int]:
+    words = re.sub(r"[^\w\s]", " ", question.lower()).split()
+    if len(words) <= SHINGLE_SIZE:
+        return {zlib.crc32(" ".join(words).encode())}
+    return {
+        zlib.crc32(" ".join(words[i : i + SHINGLE_SIZE]).encode())
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def signature(question: str) -> bytes:
+    """
+    Computes the MinHash signature of a question.
+
+    Uses one permutation hashing: each shingle is hashed once and kept as the
+    minimum of one of the slots, so the cost grows with the question length
+    rather than with the signature size. Empty slots borrow the value of the
+    next filled one to their right (densification).
+    """
+    slots = [-1] * _SLOTS
+    for shingle in _shingles(question):
+        value = (_a * shingle + _b) % _PRIME
+        slot, value = value % _SLOTS, (value // _SLOTS) & _MASK
+        if slots[slot] < 0 or value < slots[slot]:
+            slots[slot] = value
+    filled = [i for i, value in enumerate(slots) if value >= 0]
+    for i, value in enumerate(slots):
+        if value < 0:
+            j = next((x for x in filled if x > i), filled[0])
+            distance = (j - i) % _SLOTS
+            slots[i] = (slots[j] + distance * _offset) & _MASK
+    return array.array("I", slots).tobytes()
+
+
+def _bands(sig: bytes) -> list[int]:
+    size = len(sig) // BANDS
+    return [hash(sig[i * size : (i + 1) * size]) for i in range(BANDS)]
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """Estimates the Jaccard similarity of two signatures."""
+    x, y = array.array("I", a), array.array("I", b)
+    return sum(i == j for i, j in zip(x, y)) / len(x)
+
+
+def index_question(problem_id: str, sig: bytes) -> None:
+    """Adds a signature to the index, replacing any previous version of it."""
+    unindex_question(problem_id)
+    signatures[problem_id] = sig
+    for band, key in zip(bands, _bands(sig)):
+        bucket = band.setdefault(key, problem_id)
+        if bucket == problem_id:
+            continue
+        if isinstance(bucket, str):
+            band[key] = bucket = {bucket}
+        bucket.add(problem_id)
+
+
+def unindex_question(problem_id: str) -> None:
+    """Removes a question from the index."""
+    sig = signatures.pop(problem_id, None)
+    if not sig:
+        return
+    for band, key in zip(bands, _bands(sig)):
+        bucket = band[key]
+        if isinstance(bucket, str):
+            del band[key]
+            continue
+        bucket.discard(problem_id)
+        if len(bucket) == 1:
+            band[key] = bucket.pop()
+
+
+def _members(bucket: str | set[str]) -> set[str]:
+    return {bucket} if isinstance(bucket, str) else bucket
+
+
+def _candidates(sig: bytes, exclude: str | None = None) -> set[str]:
+    op = set()
+    for band, key in zip(bands, _bands(sig)):
+        if key in band:
+            op.update(_members(band[key]))
+    op.discard(exclude)  # pyright: ignore
+    return op
+
+
+def find_duplicates(sig: bytes, exclude: str | None = None) -> list[dict]:
+    """Finds indexed questions that are likely duplicates of a signature."""
+    matches = []
+    for problem_id in _candidates(sig, exclude):
+        score = similarity(sig, signatures[problem_id])
+        if score >= THRESHOLD:
+            matches.append({"id": problem_id, "similarity": score})
+    return sorted(matches, key=lambda x: x["similarity"], reverse=True)
+
+
+def duplicate_clusters() -> list[list[str]]:
+    """Groups the whole index into clusters of likely duplicates."""
+    parents = {}
+
+    def find(x: str) -> str:
+        parents.setdefault(x, x)
+        while parents[x] != x:
+            parents[x] = parents[parents[x]]
+            x = parents[x]
+        return x
+
+    for band in bands:
+        for bucket in band.values():
+            if isinstance(bucket, str):
+                continue
+            members = list(bucket)
+            for i, a in enumerate(members):
+                for b in members[i + 1 :]:
+                    if find(a) == find(b):
+                        continue
+                    if similarity(signatures[a], signatures[b]) >= THRESHOLD:
+                        parents[find(a)] = find(b)
+
+    clusters: dict[str, list[str]] = {}
+    for problem_id in parents:
+        clusters.setdefault(find(problem_id), []).append(problem_id)
+    return sorted(
+        (sorted(x) for x in clusters.values() if len(x) > 1), key=len, reverse=True
+    )
+
+
+async def build_duplicate_index() -> None:
+    """
+    Loads every stored signature into the index.
+
+    Problems stored without one are hashed off the event loop and their
+    signatures saved, so the next start only has to load them.
+    """
+    signatures.clear()
+    for band in bands:
+        band.clear()
+    missing = []
+    async for problem in iter_problem_fields(["minhash"]):
+        if problem.get("minhash"):
+            index_question(problem["id"], problem["minhash"])
+        else:
+            missing.append(problem["id"])
+    if missing:
+        await backfill_signatures(missing)
+    logger.info(f"Indexed {len(signatures)} questions for duplicate detection")
+
+
+def signatures_of(questions: dict[str, str]) -> dict[str, bytes]:
+    """Computes the signatures of many questions keyed by problem id."""
+    return {problem_id: signature(x) for problem_id, x in questions.items()}
+
+
+async def backfill_signatures(problem_ids: list[str]) -> None:
+    """Computes, stores and indexes the signatures of the given problems."""
+    for batch in batched(problem_ids):
+        questions = await get_problem_questions(batch)
+        computed = await asyncio.to_thread(signatures_of, questions)
+        await set_problem_signatures(computed)
+        for problem_id, sig in computed.items():
+            index_question(problem_id, sig)
@@ -0,0 +1,230 @@
+import asyncio, logging, weakref
+from datetime import datetime, timedelta, timezone
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from .database_handler import (
+    ExamSessionModel,
+    claim_expired_exam_sessions,
+    create_exam_session,
+    get_exam_session,
+    get_random_problem_ids,
+    save_exam_responses,
+    submit_exam_session,
+    submit_exam_sessions,
+)
+from .grading_handler import grade_answers, grade_papers, record_graded_attempts
+from .task_handler import enqueue
+from . import trending_handler
+
+FLUSH_INTERVAL = 5  # seconds between response checkpoints
+SUBMIT_BATCH = 500  # expired sessions graded per bulk write
+CLAIM_TIMEOUT = 60  # seconds before a claim on an expired session is abandoned
+
+logger = logging.getLogger(__name__)
+
+# Live sessions are kept in memory and only checkpointed to Mongo every
+# FLUSH_INTERVAL seconds, so answer clicks never hit the database directly.
+# Only changed responses are checkpointed, so a session answered through
+# several workers keeps every worker's responses. Sessions are only loaded
+# into a worker when a request for them arrives there.
+sessions: dict[str, ExamSessionModel] = {}
+dirty: dict[str, dict[str, list[str]]] = {}  # session id -> unflushed responses
+submit_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+    weakref.WeakValueDictionary()
+)
+flush_task: asyncio.Task | None = None
+grader = str(ObjectId())  # marks the expired sessions this worker claims
+
+
+class ExamError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def start_exam_engine() -> None:
+    """Starts checkpointing responses and submitting expired sessions."""
+    global flush_task
+    flush_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_exam_engine() -> None:
+    """Stops the flush loop and checkpoints whatever is still pending."""
+    if flush_task:
+        flush_task.cancel()
+        try:
+            await flush_task
+        except asyncio.CancelledError:
+            pass
+    await flush_sessions()
+
+
+async def flush_sessions() -> None:
+    """Writes every response changed since the last flush in one bulk write."""
+    if not dirty:
+        return
+    pending = dict(dirty)
+    dirty.clear()
+    try:
+        await save_exam_responses(pending)
+    except Exception as e:
+        for session_id, responses in pending.items():
+            dirty[session_id] = {**responses, **dirty.get(session_id, {})}
+        logger.error(e)
+
+
+async def _flush_loop() -> None:
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        await flush_sessions()
+        try:
+            await submit_expired_sessions()
+        except Exception as e:
+            logger.error(e)
+
+
+async def submit_expired_sessions() -> int:
+    """
+    Grades and stores every expired session, on whichever worker it started.
+
+    Sessions are claimed in batches so that workers share the load rather
+    than all grading the same ones, and each batch is graded with one read
+    of the answer keys and stored with one bulk write.
+    """
+    now = _now()
+    for session_id, session in list(sessions.items()):
+        if session.deadline <= now:
+            sessions.pop(session_id)
+    # Answers are refused after the deadline, so once every worker has had a
+    # flush since then the stored responses are final.
+    cutoff = now - timedelta(seconds=2 * FLUSH_INTERVAL)
+    submitted = 0
+    while True:
+        claimed = await claim_expired_exam_sessions(
+            grader, cutoff, SUBMIT_BATCH, CLAIM_TIMEOUT
+        )
+        if not claimed:
+            return submitted
+        results = await grade_papers(
+            {x.id: {p: x.responses.get(p, []) for p in x.problems} for x in claimed},
+            reveal=True,
+        )
+        for session in claimed:
+            session.result = results[session.id]
+            session.submitted = True
+        stored = set(await submit_exam_sessions(claimed, grader))
+        for session in claimed:
+            if session.id in stored:
+                await _record_submission(session)
+        submitted += len(stored)
+        if len(claimed) < SUBMIT_BATCH:
+            return submitted
+
+
+async def _record_submission(session: ExamSessionModel) -> None:
+    await enqueue(
+        "attempts",
+        record_graded_attempts,
+        session.user,
+        session.result["results"],
+        session.id,
+    )
+    for result in session.result["results"]:
+        if result["attempted"]:
+            trending_handler.record(result["problem_id"], "attempt")
+
+
+async def start_session(
+    user: str, exam: str, questions: int, duration: int, subject: str | None = None
+) -> ExamSessionModel:
+    """Starts a timed exam session on a freshly generated paper."""
+    problems = await get_random_problem_ids(exam, questions, subject)
+    if not problems:
+        raise ExamError("No problems available for this paper")
+    started_at = _now()
+    session = ExamSessionModel(
+        id=str(ObjectId()),
+        user=user,
+        exam=exam,
+        problems=problems,
+        started_at=started_at,
+        deadline=started_at + timedelta(minutes=duration),
+    )
+    # Store it straight away so the paper survives a crash before the first flush.
+    await create_exam_session(session)
+    sessions[session.id] = session
+    return session
+
+
+async def get_session(session_id: str, user: str) -> ExamSessionModel:
+    """Gets a session owned by the user, from memory or from its last checkpoint."""
+    session = sessions.get(session_id)
+    if not session:
+        try:
+            session = await get_exam_session(session_id)
+        except (ValueError, InvalidId):
+            raise ExamError("Exam session not found")
+        if not session.submitted:
+            # Started on another worker; keep it here so responses are buffered.
+            session = sessions.setdefault(session_id, session)
+    if session.user != user:
+        raise ExamError("Exam session not found")
+    return session
+
+
+async def record_response(
+    session_id: str, user: str, problem_id: str, answers: list[str]
+) -> ExamSessionModel:
+    """Records an answer in memory; it is persisted on the next flush."""
+    session = await get_session(session_id, user)
+    if session.submitted:
+        raise ExamError("Exam session already submitted")
+    if session.deadline <= _now():
+        await submit_session(session_id, user)
+        raise ExamError("Exam session has ended")
+    if problem_id not in session.problems:
+        raise ExamError("Problem is not part of this exam")
+    session.responses[problem_id] = answers
+    dirty.setdefault(session_id, {})[problem_id] = answers
+    return session
+
+
+async def submit_session(session_id: str, user: str) -> ExamSessionModel:
+    """Grades a session with one bulk read of its answer keys and persists it."""
+    # Held across every await so the flush loop and the user cannot both grade
+    # the same session on this worker.
+    lock = submit_locks.setdefault(session_id, asyncio.Lock())
+    async with lock:
+        session = await get_session(session_id, user)
+        if session.submitted:
+            return session
+        # Checkpoint this worker's responses, then grade the stored session so
+        # responses checkpointed by other workers count too.
+        responses = dirty.pop(session_id, None)
+        if responses:
+            try:
+                await save_exam_responses({session_id: responses})
+            except Exception:
+                dirty[session_id] = {**responses, **dirty.get(session_id, {})}
+                raise
+        try:
+            session = await get_exam_session(session_id)
+        except ValueError:
+            raise ExamError("Exam session not found")
+        if not session.submitted:
+            session.result = await grade_answers(
+                {x: session.responses.get(x, []) for x in session.problems},
+                reveal=True,
+            )
+            session.submitted = True
+            # Another worker may have submitted it meanwhile; only one write wins.
+            if await submit_exam_session(session):
+                await _record_submission(session)
+            else:
+                session = await get_exam_session(session_id)
+        sessions.pop(session_id, None)
+        dirty.pop(session_id, None)
+        return session
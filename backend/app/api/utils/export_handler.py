@@ -0,0 +1,71 @@
+import asyncio, csv, io, json, zlib
+from typing import AsyncIterator
+from .database_handler import iter_problems
+
+EXPORT_BATCH_SIZE = 2000  # documents per cursor batch and per streamed chunk
+
+CSV_FIELDS = [
+    "id",
+    "exam",
+    "difficulty",
+    "type",
+    "subject",
+    "category",
+    "question",
+    "options",
+    "correct_answers",
+    "comments",
+]
+LIST_FIELDS = {"options", "correct_answers", "comments"}
+
+
+def _ndjson_rows(problems: list[dict]) -> str:
+    return "".join(json.dumps(problem) + "\n" for problem in problems)
+
+
+def _csv_rows(problems: list[dict], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    for problem in problems:
+        writer.writerow(
+            {
+                key: json.dumps(value) if key in LIST_FIELDS else value
+                for key, value in problem.items()
+            }
+        )
+    return buffer.getvalue()
+
+
+async def export_problems(
+    query: dict, format: str = "ndjson", compress: bool = False
+) -> AsyncIterator[bytes]:
+    """Streams problems as NDJSON or CSV, one cursor batch per chunk."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+
+    def encode(batch: list[dict], header: bool) -> bytes:
+        if format == "csv":
+            text = _csv_rows(batch, header=header)
+        else:
+            text = _ndjson_rows(batch)
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+
+    first = True
+    batch = []
+    async for problem in iter_problems(query, batch_size=EXPORT_BATCH_SIZE):
+        batch.append(problem)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            # Encoding and compressing a batch is CPU bound, so keep it off the loop.
+            chunk = await asyncio.to_thread(encode, batch, first)
+            first = False
+            batch = []
+            if chunk:
+                yield chunk
+    if batch or (format == "csv" and first):
+        chunk = await asyncio.to_thread(encode, batch, first)
+        if chunk:
+            yield chunk
+    if compressor:
+        yield compressor.flush()
@@ -1,6 +1,7 @@
 import aiohttp, os, logging
 from dotenv import load_dotenv, find_dotenv
 from .database_handler import get_user_by_id, update_user_session
+from .task_handler import enqueue
 
 load_dotenv(find_dotenv())
 
@@ -29,7 +30,5 @@ async def refresh_token(userid: str) -> str:
         r = await session.post("https://oauth2.googleapis.com/token", data=payload)
         response = await r.json()
         access_token = response["access_token"]
-        e = await update_user_session(userid, access_token)
-        if e:
-            return access_token
-        raise GoogleError("Could not update the user session.")
+        await enqueue("session", update_user_session, userid, access_token)
+        return access_token
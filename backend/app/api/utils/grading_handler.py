@@ -0,0 +1,98 @@
+import logging
+from .database_handler import get_answer_keys, record_attempts
+
+logger = logging.getLogger(__name__)
+
+
+class GradingError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def _to_number(value: str) -> float | None:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def is_correct(type: str, correct_answers: list[str], answers: list[str]) -> bool:
+    """Checks the answers to a single problem according to its type."""
+    if not answers:
+        return False
+    if type == "single":
+        return len(answers) == 1 and answers[0] in correct_answers
+    if type == "multiple":
+        return set(answers) == set(correct_answers)
+    if type == "integer":
+        if len(answers) != 1:
+            return False
+        answer = _to_number(answers[0].strip())
+        return answer is not None and any(
+            answer == _to_number(x.strip()) for x in correct_answers
+        )
+    raise GradingError(f"Unknown problem type: {type}")
+
+
+def _grade(
+    submissions: dict[str, list[str]], answer_keys: dict[str, dict], reveal: bool
+) -> dict:
+    results, void = [], []
+    for problem_id, answers in submissions.items():
+        key = answer_keys.get(problem_id)
+        if not key:
+            void.append(problem_id)
+            continue
+        result = {
+            "problem_id": problem_id,
+            "attempted": bool(answers),
+            "correct": is_correct(key["type"], key["correct_answers"], answers),
+            "subject": key["subject"],
+            "category": key["category"],
+            "difficulty": key["difficulty"],
+        }
+        if reveal and answers:
+            result["correct_answers"] = key["correct_answers"]
+        results.append(result)
+    return {
+        "results": results,
+        "void": void,
+        "score": sum(result["correct"] for result in results),
+        "total": len(results),
+    }
+
+
+async def grade_answers(
+    submissions: dict[str, list[str]], reveal: bool = False
+) -> dict:
+    """
+    Grades answers to many problems, loading all answer keys in one query.
+
+    With reveal, the answer key of each attempted problem is included in its
+    result. Unattempted problems never reveal theirs. Problems that no longer
+    exist are listed as void and count towards neither score nor total.
+    """
+    return _grade(submissions, await get_answer_keys(list(submissions)), reveal)
+
+
+async def grade_papers(
+    papers: dict[str, dict[str, list[str]]], reveal: bool = False
+) -> dict[str, dict]:
+    """Grades many papers like grade_answers, with one query for all their keys."""
+    problem_ids = {problem_id for paper in papers.values() for problem_id in paper}
+    answer_keys = await get_answer_keys(list(problem_ids))
+    return {
+        paper_id: _grade(submissions, answer_keys, reveal)
+        for paper_id, submissions in papers.items()
+    }
+
+
+async def record_graded_attempts(
+    user_id: str, results: list[dict], batch_id: str
+) -> None:
+    """
+    Records the attempted problems of a graded paper against the user.
+
+    batch_id identifies the paper, so recording it twice counts it once.
+    """
+    await record_attempts(user_id, [x for x in results if x["attempted"]], batch_id)
@@ -0,0 +1,95 @@
+import logging
+from typing import Awaitable, Callable
+from pymongo import errors
+from .database_handler import (
+    AUTH_VALIDATOR,
+    PROBLEMS_VALIDATOR,
+    COMMENTS_VALIDATOR,
+    ensure_collection,
+    ensure_index,
+    stamp_unversioned_problems,
+    get_applied_migrations,
+    record_migration,
+)
+
+logger = logging.getLogger(__name__)
+
+# Migrations run in version order and are recorded in meta.migrations once
+# applied. They must be idempotent: two workers starting together may both
+# apply the same one before either records it. Never edit an applied
+# migration; add a new one instead.
+migrations: dict[int, tuple[str, Callable[[], Awaitable[None]]]] = {}
+
+
+def migration(version: int, description: str):
+    def decorator(func: Callable[[], Awaitable[None]]):
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version: {version}")
+        migrations[version] = (description, func)
+        return func
+
+    return decorator
+
+
+@migration(1, "Create collections and apply validators")
+async def apply_validators() -> None:
+    await ensure_collection("users", "auth_details", AUTH_VALIDATOR)
+    await ensure_collection("problems", "problems", PROBLEMS_VALIDATOR)
+    await ensure_collection("comments", "comments", COMMENTS_VALIDATOR)
+
+
+@migration(2, "Index usernames, emails and comments by problem")
+async def index_users_and_comments() -> None:
+    await ensure_index("users", "auth_details", "username", unique=True)
+    await ensure_index("users", "auth_details", "email", unique=True)
+    await ensure_index("comments", "comments", "problem")
+
+
+@migration(3, "Index attempts and open exam sessions")
+async def index_attempts_and_sessions() -> None:
+    await ensure_index("users", "attempts", [("user", 1), ("problem", 1)])
+    await ensure_index("exams", "sessions", [("user", 1), ("submitted", 1)])
+    await ensure_index("exams", "sessions", "submitted")
+
+
+@migration(4, "Index trending counters by last update")
+async def index_trending() -> None:
+    await ensure_index("problems", "trending", "updated_at")
+
+
+@migration(5, "Add sync versions and tombstones to problems")
+async def version_problems() -> None:
+    await ensure_collection("problems", "problems", PROBLEMS_VALIDATOR)
+    await ensure_index("problems", "problems", "version")
+    await ensure_index("problems", "tombstones", "version")
+    stamped = await stamp_unversioned_problems()
+    logger.info(f"Stamped {stamped} problems with a sync version")
+
+
+@migration(6, "Store duplicate detection signatures with problems")
+async def sign_problems() -> None:
+    await ensure_collection("problems", "problems", PROBLEMS_VALIDATOR)
+    # The missing signatures themselves are backfilled by build_duplicate_index.
+
+
+@migration(7, "Index open exam sessions by deadline")
+async def index_session_deadlines() -> None:
+    await ensure_index("exams", "sessions", [("submitted", 1), ("deadline", 1)])
+
+
+async def run_migrations() -> list[int]:
+    """Applies every pending migration in order, without touching existing data."""
+    applied = await get_applied_migrations()
+    ran = []
+    for version in sorted(migrations):
+        if version in applied:
+            continue
+        description, func = migrations[version]
+        logger.info(f"Applying migration {version}: {description}")
+        await func()
+        try:
+            await record_migration(version, description)
+        except errors.DuplicateKeyError:
+            logger.info(f"Migration {version} was recorded by another worker")
+        ran.append(version)
+    return ran
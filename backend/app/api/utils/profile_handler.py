@@ -0,0 +1,149 @@
+import cProfile, functools, itertools, logging, marshal, random, threading, time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from .session_handler import check_admin
+
+PROFILE_HEADER = b"x-profile-request"
+MAX_PROFILES = 50  # profiles kept in the ring buffer
+
+logger = logging.getLogger(__name__)
+
+sample_rate = 0.0  # fraction of all requests to profile, set by admins at runtime
+profiles: deque[dict] = deque(maxlen=MAX_PROFILES)
+current_profile: ContextVar[dict | None] = ContextVar("current_profile", default=None)
+span_depth: ContextVar[int] = ContextVar("span_depth", default=0)
+
+_ids = itertools.count(1)
+# Only one cProfile can run per interpreter, so overlapping profiled
+# requests after the first record timing spans only.
+_cprofile_lock = threading.Lock()
+
+
+def set_sample_rate(rate: float) -> None:
+    """Sets the fraction of requests profiled, clamped to between 0 and 1."""
+    global sample_rate
+    sample_rate = min(max(rate, 0.0), 1.0)
+
+
+def profiled(func):
+    """Records a timing span for each call made while a request is profiled."""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None or profile["_finished"]:
+            return await func(*args, **kwargs)
+        depth = span_depth.get()
+        token = span_depth.set(depth + 1)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            ended = time.perf_counter()
+            span_depth.reset(token)
+            # Tasks started by the request can outlive it; the profile is closed.
+            if not profile["_finished"]:
+                profile["spans"].append(
+                    {
+                        "name": func.__name__,
+                        "depth": depth,
+                        "start_ms": (started - profile["_started"]) * 1000,
+                        "duration_ms": (ended - started) * 1000,
+                    }
+                )
+
+    return wrapper
+
+
+def db_time(spans: list[dict]) -> float:
+    """
+    Gets the wall time in milliseconds covered by top level spans.
+
+    Nested spans are already inside their parent, and spans running
+    concurrently overlap, so neither is counted twice.
+    """
+    top = sorted((x for x in spans if not x["depth"]), key=lambda x: x["start_ms"])
+    total = 0.0
+    end = float("-inf")
+    for span in top:
+        start = max(span["start_ms"], end)
+        end = max(end, span["start_ms"] + span["duration_ms"])
+        total += max(end - start, 0.0)
+    return total
+
+
+def _wants_profile(scope) -> bool:
+    if sample_rate and random.random() < sample_rate:
+        return True
+    if dict(scope["headers"]).get(PROFILE_HEADER) not in (b"1", b"true"):
+        return False
+    session = scope.get("session") or {}
+    return check_admin(session.get("user_id"))
+
+
+def summary(profile: dict) -> dict:
+    """Gets a profile without its raw cProfile data."""
+    return {key: value for key, value in profile.items() if not key.startswith("_")}
+
+
+def get_profile(profile_id: int) -> dict | None:
+    """Gets a profile from the ring buffer by its id."""
+    return next((x for x in profiles if x["id"] == profile_id), None)
+
+
+class ProfilingMiddleware:
+    """Profiles sampled requests, or an admin's request sent with X-Profile-Request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = next(_ids)
+        profile = {
+            "id": profile_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": None,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "total_ms": None,
+            "db_ms": None,
+            "spans": [],
+            "_started": time.perf_counter(),
+            "_pstats": None,
+            "_finished": False,
+        }
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile["status"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", str(profile_id).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        # The cProfile data covers the whole event loop thread while the request
+        # runs, so concurrent requests show up in it; the spans do not.
+        profiler = None
+        if _cprofile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        token = current_profile.set(profile)
+        try:
+            if profiler:
+                profiler.enable()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler:
+                profiler.disable()
+                _cprofile_lock.release()
+                profiler.create_stats()
+                profile["_pstats"] = marshal.dumps(profiler.stats)  # pyright: ignore
+            current_profile.reset(token)
+            profile["_finished"] = True
+            profile["total_ms"] = (time.perf_counter() - profile["_started"]) * 1000
+            profile["db_ms"] = db_time(profile["spans"])
+            profiles.append(profile)
@@ -0,0 +1,165 @@
+import asyncio, logging, random
+from .database_handler import (
+    UserStatsModel,
+    iter_problem_fields,
+    get_attempted_problem_ids,
+    get_user_stats,
+    stat_key,
+)
+
+logger = logging.getLogger(__name__)
+
+# Every problem lives in exactly one (exam, subject, category, difficulty)
+# bucket. Buckets are lists so a random candidate can be drawn in O(1);
+# positions lets a problem be swap-removed from its bucket in O(1) as well.
+buckets: dict[tuple[str, str, str, str], list[str]] = {}
+positions: dict[str, int] = {}
+metadata: dict[str, dict] = {}
+
+INDEXED_FIELDS = ["exam", "subject", "category", "difficulty"]
+DIFFICULTIES = ["easy", "medium", "hard"]
+MAX_DRAWS = 8  # random draws per bucket before falling back to a scan
+
+
+def _key(meta: dict) -> tuple[str, str, str, str]:
+    return (meta["exam"], meta["subject"], meta["category"], meta["difficulty"])
+
+
+def index_problem(problem_id: str, **fields) -> None:
+    """Adds a problem to the index, moving it if its bucket changed."""
+    meta = {**metadata.get(problem_id, {}), **fields}
+    if not all(meta.get(x) for x in INDEXED_FIELDS):
+        return
+    unindex_problem(problem_id)
+    key = _key(meta)
+    bucket = buckets.setdefault(key, [])
+    positions[problem_id] = len(bucket)
+    bucket.append(problem_id)
+    metadata[problem_id] = meta
+
+
+def reindex_problem(problem_id: str, **fields) -> None:
+    """Updates the fields of an indexed problem, ignoring unknown ids."""
+    if problem_id in metadata:
+        index_problem(problem_id, **fields)
+
+
+def unindex_problem(problem_id: str) -> None:
+    """Removes a problem from the index."""
+    meta = metadata.pop(problem_id, None)
+    if not meta:
+        return
+    key = _key(meta)
+    bucket = buckets[key]
+    position = positions.pop(problem_id)
+    last = bucket.pop()
+    if last != problem_id:
+        bucket[position] = last
+        positions[last] = position
+    if not bucket:
+        del buckets[key]
+
+
+async def build_recommendation_index() -> None:
+    """Builds the index from scratch with a single pass over the problem bank."""
+    buckets.clear()
+    positions.clear()
+    metadata.clear()
+    async for problem in iter_problem_fields(INDEXED_FIELDS):
+        index_problem(problem.pop("id"), **problem)
+    logger.info(f"Indexed {len(metadata)} problems for recommendations")
+
+
+def _target_difficulty(accuracy: float) -> str:
+    if accuracy < 0.5:
+        return "easy"
+    if accuracy < 0.8:
+        return "medium"
+    return "hard"
+
+
+def _accuracy(stats: UserStatsModel, subject: str, category: str) -> float:
+    # Laplace smoothing puts unseen categories at 0.5, between weak and strong ones.
+    subject_stats = stats.subjects.get(stat_key(subject))
+    stat = subject_stats.categories.get(stat_key(category)) if subject_stats else None
+    correct, attempts = (stat.correct, stat.attempts) if stat else (0, 0)
+    return (correct + 1) / (attempts + 2)
+
+
+def _draw(bucket: list[str], exclude: set[str]) -> str | None:
+    for _ in range(min(MAX_DRAWS, len(bucket))):
+        problem_id = random.choice(bucket)
+        if problem_id not in exclude:
+            return problem_id
+    return next((x for x in bucket if x not in exclude), None)
+
+
+def recommend(
+    stats: UserStatsModel,
+    attempted: set[str],
+    count: int = 10,
+    exam: str | None = None,
+    subject: str | None = None,
+) -> list[dict]:
+    """Picks unattempted problems from the weakest categories at a fitting level."""
+    exams = [exam] if exam else list({x[0] for x in buckets})
+    categories = {
+        (x[1], x[2])
+        for x in buckets
+        if (not exam or x[0] == exam) and (not subject or x[1] == subject)
+    }
+    accuracy = {x: _accuracy(stats, *x) for x in categories}
+    ranked = sorted(categories, key=lambda x: (accuracy[x], random.random()))
+
+    picked: list[str] = []
+    seen = set(attempted)
+    while len(picked) < count and ranked:
+        exhausted = []
+        for category in ranked:
+            if len(picked) >= count:
+                break
+            target = _target_difficulty(accuracy[category])
+            # Fall back to the nearest other difficulty when the target runs dry.
+            order = sorted(
+                DIFFICULTIES,
+                key=lambda x: abs(DIFFICULTIES.index(x) - DIFFICULTIES.index(target)),
+            )
+            candidates = (
+                buckets.get((x, *category, difficulty), [])
+                for difficulty in order
+                for x in random.sample(exams, len(exams))
+            )
+            for bucket in candidates:
+                problem_id = _draw(bucket, seen)
+                if problem_id:
+                    picked.append(problem_id)
+                    seen.add(problem_id)
+                    break
+            else:
+                exhausted.append(category)
+        ranked = [x for x in ranked if x not in exhausted]
+
+    return [
+        {
+            "id": problem_id,
+            "subject": metadata[problem_id]["subject"],
+            "category": metadata[problem_id]["category"],
+            "difficulty": metadata[problem_id]["difficulty"],
+        }
+        for problem_id in picked
+    ]
+
+
+async def recommend_for_user(
+    user_id: str, count: int = 10, exam: str | None = None, subject: str | None = None
+) -> list[dict]:
+    """
+    Recommends the next problems for a user.
+
+    Accuracy comes from the user's materialized stats, so only the ids of the
+    problems they attempted are read from their history.
+    """
+    stats, attempted = await asyncio.gather(
+        get_user_stats(user_id), get_attempted_problem_ids(user_id)
+    )
+    return recommend(stats, attempted, count, exam, subject)
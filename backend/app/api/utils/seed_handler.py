@@ -0,0 +1,166 @@
+import asyncio, logging, random, time
+from bson.objectid import ObjectId
+from .database_handler import insert_documents, stamp_unversioned_problems
+from .duplicate_handler import signature
+
+SEED_BATCH_SIZE = 5000
+CONCURRENCY = 4  # insert_many calls in flight at once
+ID_SAMPLE = 100_000  # ids kept in memory to link comments to users and problems
+
+SUBJECTS = {
+    "jee": ["mathematics", "physics", "chemistry"],
+    "neet": ["physics", "chemistry", "zoology", "botany"],
+}
+CATEGORIES = {
+    "mathematics": ["algebra", "calculus", "coordinate geometry", "probability"],
+    "physics": ["kinematics", "thermodynamics", "electrostatics", "optics"],
+    "chemistry": ["organic", "inorganic", "physical", "equilibrium"],
+    "zoology": ["human physiology", "genetics", "evolution", "animal kingdom"],
+    "botany": ["plant physiology", "ecology", "cell biology", "morphology"],
+}
+WORDS = (
+    "find value mass velocity force ratio energy reaction rate constant "
+    "particle field system cell plant organism function equation angle "
+    "surface area volume charge current pressure temperature length time"
+).split()
+
+logger = logging.getLogger(__name__)
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def fake_problem(rng: random.Random) -> dict:
+    exam = rng.choice(list(SUBJECTS))
+    subject = rng.choice(SUBJECTS[exam])
+    type = rng.choices(["single", "multiple", "integer"], weights=[6, 2, 2])[0]
+    if type == "integer":
+        options = []
+        correct_answers = [str(rng.randint(0, 999))]
+    else:
+        options = rng.sample(range(1, 1000), 4)
+        options = [f"{x} {rng.choice(WORDS)}" for x in options]
+        count = 1 if type == "single" else rng.randint(2, 4)
+        correct_answers = rng.sample(options, count)
+    question = _sentence(rng, rng.randint(12, 40)) + "?"
+    return {
+        "_id": ObjectId(),
+        "exam": exam,
+        "difficulty": rng.choice(["easy", "medium", "hard"]),
+        "type": type,
+        "subject": subject,
+        "category": rng.choice(CATEGORIES[subject]),
+        "question": question,
+        "options": options,
+        "correct_answers": correct_answers,
+        "comments": [],
+        "minhash": signature(question),
+    }
+
+
+def fake_user(rng: random.Random, number: int) -> dict:
+    tag = f"{number}{rng.randrange(16**6):06x}"
+    return {
+        "_id": ObjectId(),
+        "username": f"seed_user_{tag}",
+        "email": f"seed_user_{tag}@example.com",
+        "profile_picture": f"https://example.com/avatars/{tag}.png",
+        "is_google": True,
+        "ranking": {"rating": rng.randint(0, 3000), "rank": number + 1},
+        "google_data": {
+            "google_id": tag,
+            "access_token": f"seed-access-{tag}",
+            "refresh_token": f"seed-refresh-{tag}",
+        },
+    }
+
+
+def fake_comment(
+    rng: random.Random, users: list[ObjectId], problems: list[ObjectId]
+) -> dict:
+    return {
+        "user": rng.choice(users),
+        "comment": _sentence(rng, rng.randint(4, 25)) + ".",
+        "problem": rng.choice(problems),
+        "likes": rng.randint(0, 50),
+    }
+
+
+def _keep(sample: list[ObjectId], seen: int, value: ObjectId, rng: random.Random):
+    # Reservoir sampling keeps a uniform sample of ids in bounded memory.
+    if len(sample) < ID_SAMPLE:
+        sample.append(value)
+        return
+    slot = rng.randrange(seen)
+    if slot < ID_SAMPLE:
+        sample[slot] = value
+
+
+async def _insert(db: str, name: str, batches) -> int:
+    inserted = 0
+
+    async def insert(batch: list[dict]) -> None:
+        nonlocal inserted
+        inserted += await insert_documents(db, name, batch)
+
+    pending = set()
+    for batch in batches:
+        # Generate lazily, never holding more than CONCURRENCY batches at once.
+        while len(pending) >= CONCURRENCY:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                task.result()
+        pending.add(asyncio.create_task(insert(batch)))
+    if pending:
+        await asyncio.gather(*pending)
+    return inserted
+
+
+async def seed(
+    problems: int = 0,
+    users: int = 0,
+    comments: int = 0,
+    random_seed: int | None = None,
+    batch_size: int = SEED_BATCH_SIZE,
+) -> dict[str, int]:
+    """Bulk inserts realistic synthetic problems, users and comments."""
+    if comments and (not problems or not users):
+        raise ValueError("Seeding comments needs problems and users in the same run")
+    rng = random.Random(random_seed)
+    problem_ids: list[ObjectId] = []
+    user_ids: list[ObjectId] = []
+    op = {}
+
+    def problem_batches():
+        for start in range(0, problems, batch_size):
+            count = min(batch_size, problems - start)
+            batch = [fake_problem(rng) for _ in range(count)]
+            for i, problem in enumerate(batch):
+                _keep(problem_ids, start + i + 1, problem["_id"], rng)
+            yield batch
+
+    def user_batches():
+        for start in range(0, users, batch_size):
+            count = min(batch_size, users - start)
+            batch = [fake_user(rng, start + i) for i in range(count)]
+            for i, user in enumerate(batch):
+                _keep(user_ids, start + i + 1, user["_id"], rng)
+            yield batch
+
+    def comment_batches():
+        for start in range(0, comments, batch_size):
+            count = min(batch_size, comments - start)
+            yield [fake_comment(rng, user_ids, problem_ids) for _ in range(count)]
+
+    started = time.perf_counter()
+    op["problems"] = await _insert("problems", "problems", problem_batches())
+    # Stamped after the concurrent inserts land, in order and with the server's
+    # clock, so delta sync never sees a version before an older one.
+    await stamp_unversioned_problems()
+    op["users"] = await _insert("users", "auth_details", user_batches())
+    op["comments"] = await _insert("comments", "comments", comment_batches())
+    logger.info(f"Seeded {op} in {time.perf_counter() - started:.1f}s")
+    return op
@@ -7,10 +7,15 @@ load_dotenv(find_dotenv())
 admins = environ["ADMINS"].split(", ")
 
 
+def check_admin(user_id: str | None) -> bool:
+    """Checks whether a user id belongs to an admin."""
+    return user_id in admins
+
+
 async def is_admin(request: Request):
     """Validates the session of the user."""
     try:
-        assert request.session["user_id"] in admins
+        assert check_admin(request.session.get("user_id"))
     except AssertionError:
         raise HTTPException(status_code=403, detail="You are not an admin.")
 
@@ -0,0 +1,121 @@
+import asyncio, contextvars, logging
+from typing import Any, Awaitable, Callable
+
+MAX_QUEUE = 1000  # enqueue waits once this many tasks of a type are pending
+MAX_RETRIES = 3  # failed tasks are rerun, so they must be safe to run twice
+BACKOFF = 0.5  # seconds, doubled on every retry
+DRAIN_TIMEOUT = 30  # seconds to flush pending tasks on shutdown
+
+# Workers per task type; types not listed get DEFAULT_LIMIT. Each type has its
+# own queue and workers, so a backlog of one type never holds up another.
+LIMITS = {"sweep": 1, "stats_rebuild": 1, "comment_cascade": 2}
+DEFAULT_LIMIT = 4
+
+logger = logging.getLogger(__name__)
+
+running = False
+queues: dict[str, asyncio.Queue] = {}
+workers: dict[str, list[asyncio.Task]] = {}
+metrics: dict[str, dict[str, int]] = {}
+
+
+def _metrics(kind: str) -> dict[str, int]:
+    return metrics.setdefault(
+        kind, {"queued": 0, "running": 0, "done": 0, "retried": 0, "failed": 0}
+    )
+
+
+def _queue(kind: str) -> asyncio.Queue:
+    if kind not in queues:
+        queues[kind] = asyncio.Queue(maxsize=MAX_QUEUE)
+        # Started from an empty context, since a task copies the context of the
+        # request that created it; a worker must not keep a request's profile.
+        context = contextvars.Context()
+        workers[kind] = [
+            context.run(asyncio.create_task, _worker(kind, queues[kind]))
+            for _ in range(LIMITS.get(kind, DEFAULT_LIMIT))
+        ]
+    return queues[kind]
+
+
+async def start_task_workers() -> None:
+    """Starts accepting tasks; each type's workers start with its first task."""
+    global running
+    running = True
+
+
+async def stop_task_workers() -> None:
+    """Flushes pending tasks, then stops every worker."""
+    global running
+    if not running:
+        return
+    running = False
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(x.join() for x in queues.values())),
+            timeout=DRAIN_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        dropped = sum(x.qsize() for x in queues.values())
+        logger.error(f"Dropped {dropped} tasks that did not drain in time")
+    tasks = [task for pool in workers.values() for task in pool]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    queues.clear()
+    workers.clear()
+
+
+async def enqueue(
+    kind: str, func: Callable[..., Awaitable[Any]], *args, **kwargs
+) -> None:
+    """
+    Hands a coroutine function off to the workers of its task type.
+
+    Waits while that type's queue is full. Runs the task inline when the
+    workers are not running, so side effects are never silently lost.
+    """
+    if not running:
+        await func(*args, **kwargs)
+        return
+    _metrics(kind)["queued"] += 1
+    await _queue(kind).put((func, args, kwargs))
+
+
+def get_metrics() -> dict:
+    """Gets the queue depth and per task type counters."""
+    return {
+        "depth": sum(x.qsize() for x in queues.values()),
+        "capacity": MAX_QUEUE,
+        "workers": sum(len(x) for x in workers.values()),
+        "tasks": metrics,
+    }
+
+
+async def _run(kind: str, func: Callable[..., Awaitable[Any]], args, kwargs) -> None:
+    stats = _metrics(kind)
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            await func(*args, **kwargs)
+            stats["done"] += 1
+            return
+        except Exception as e:
+            if attempt == MAX_RETRIES:
+                stats["failed"] += 1
+                logger.error(f"Task {kind} failed after {attempt + 1} attempts: {e}")
+                return
+            stats["retried"] += 1
+            await asyncio.sleep(BACKOFF * 2**attempt)
+
+
+async def _worker(kind: str, queue: asyncio.Queue) -> None:
+    stats = _metrics(kind)
+    while True:
+        func, args, kwargs = await queue.get()
+        stats["queued"] -= 1
+        stats["running"] += 1
+        try:
+            await _run(kind, func, args, kwargs)
+        finally:
+            stats["running"] -= 1
+            queue.task_done()
@@ -0,0 +1,128 @@
+import asyncio, logging, time
+from .database_handler import merge_trending, get_trending
+
+HALF_LIFE = 3600  # seconds for a view or attempt to lose half its weight
+FLUSH_INTERVAL = 15  # seconds between flushing counters and refreshing the top K
+TOP_K = 50
+CAPACITY = 2000  # counters tracked per worker before the lightest are dropped
+WEIGHTS = {"view": 1.0, "attempt": 3.0}
+
+logger = logging.getLogger(__name__)
+
+# Forward decay: an event at time t adds weight * 2 ** ((t - landmark) / HALF_LIFE)
+# so no counter has to be touched when time passes. Scores are only comparable
+# to each other; divide by the same factor at "now" to get the decayed value.
+landmark = time.time()
+counters: dict[str, list[float]] = {}  # problem id -> [score, views, attempts]
+pending: dict[str, list[float]] = {}  # same shape, since the last flush
+snapshot: list[dict] = []  # merged top K across all workers
+flush_task: asyncio.Task | None = None
+
+
+def _boost(now: float) -> float:
+    global landmark
+    exponent = (now - landmark) / HALF_LIFE
+    if exponent > 64:
+        # Rebase before the boost factor grows large enough to lose precision.
+        scale = 2**-exponent
+        for table in (counters, pending):
+            for counter in table.values():
+                counter[0] *= scale
+        landmark = now
+        exponent = 0
+    return 2**exponent
+
+
+def _prune(table: dict[str, list[float]]) -> None:
+    # Keep the heaviest hitters only; the dropped tail barely moves the top K.
+    if len(table) <= CAPACITY * 2:
+        return
+    keep = sorted(table.items(), key=lambda x: x[1][0], reverse=True)[:CAPACITY]
+    table.clear()
+    table.update(keep)
+
+
+def record(problem_id: str, kind: str = "view") -> None:
+    """Counts a view or an attempt of a problem in memory."""
+    weight = WEIGHTS[kind] * _boost(time.time())
+    for table in (counters, pending):
+        counter = table.setdefault(problem_id, [0.0, 0, 0])
+        counter[0] += weight
+        counter[1 if kind == "view" else 2] += 1
+        _prune(table)
+
+
+def forget(problem_ids: list[str]) -> None:
+    """Drops deleted problems from the counters and the current top K."""
+    global snapshot
+    removed = set(problem_ids)
+    for problem_id in removed:
+        counters.pop(problem_id, None)
+        pending.pop(problem_id, None)
+    snapshot = [x for x in snapshot if x["id"] not in removed]
+
+
+def local_top(k: int = TOP_K) -> list[dict]:
+    """Gets this worker's own top K, decayed to now."""
+    scale = 1 / _boost(time.time())
+    top = sorted(counters.items(), key=lambda x: x[1][0], reverse=True)[:k]
+    return [
+        {"id": problem_id, "score": score * scale, "views": views, "attempts": attempts}
+        for problem_id, (score, views, attempts) in top
+    ]
+
+
+def trending(k: int = TOP_K) -> list[dict]:
+    """Gets the current top K, preferring the snapshot merged across workers."""
+    return (snapshot or local_top(k))[:k]
+
+
+async def flush_trending() -> None:
+    """Merges pending counters into Mongo and refreshes the merged top K."""
+    global snapshot
+    now = time.time()
+    if pending:
+        batch = dict(pending)
+        pending.clear()
+        scale = 1 / _boost(now)
+        deltas = [
+            {"id": x, "score": c[0] * scale, "views": c[1], "attempts": c[2]}
+            for x, c in batch.items()
+        ]
+        try:
+            await merge_trending(deltas, now, HALF_LIFE)
+        except Exception as e:
+            logger.error(e)
+            # Keep the counts for the next flush rather than losing them.
+            for problem_id, counter in batch.items():
+                current = pending.setdefault(problem_id, [0.0, 0, 0])
+                for i, value in enumerate(counter):
+                    current[i] += value
+    try:
+        snapshot = await get_trending(now, HALF_LIFE, TOP_K)
+    except Exception as e:
+        logger.error(e)
+
+
+async def _flush_loop() -> None:
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        await flush_trending()
+
+
+async def start_trending_engine() -> None:
+    """Loads the merged top K and starts the periodic flush."""
+    global flush_task
+    await flush_trending()
+    flush_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_trending_engine() -> None:
+    """Stops the flush loop and merges whatever is still pending."""
+    if flush_task:
+        flush_task.cancel()
+        try:
+            await flush_task
+        except asyncio.CancelledError:
+            pass
+    await flush_trending()
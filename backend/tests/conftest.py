@@ -0,0 +1,8 @@
+import os, sys
+
+# The handlers read their settings at import time; the unit tests never
+# connect to anything, so any values will do.
+os.environ.setdefault("MONGO_CONNECTION_STR", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET", "test")
+os.environ.setdefault("ADMINS", "admin@example.com")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
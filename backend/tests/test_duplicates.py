@@ -0,0 +1,55 @@
+import pytest
+from app.api.utils import duplicate_handler as d
+
+QUESTION = (
+    "A block of mass 2 kg slides down a frictionless incline of angle 30 degrees "
+    "starting from rest. Find its speed after it has travelled 5 m along the incline."
+)
+
+
+@pytest.fixture(autouse=True)
+def index():
+    yield
+    d.signatures.clear()
+    for band in d.bands:
+        band.clear()
+
+
+def test_signature_is_stable():
+    assert d.signature(QUESTION) == d.signature(QUESTION)
+    assert len(d.signature(QUESTION)) == d._SLOTS * 4
+    assert d.signature("What is 2 + 2?")
+
+
+def test_similarity():
+    near = QUESTION.replace("5 m", "5 metres")
+    other = "Name the noble gas with the lowest boiling point and explain why."
+    assert d.similarity(d.signature(QUESTION), d.signature(QUESTION)) == 1
+    assert d.similarity(d.signature(QUESTION), d.signature(near)) >= d.THRESHOLD
+    assert d.similarity(d.signature(QUESTION), d.signature(other)) < 0.2
+
+
+def test_find_duplicates():
+    d.index_question("a", d.signature(QUESTION))
+    d.index_question("b", d.signature("Balance the equation H2 + O2 -> H2O."))
+    matches = d.find_duplicates(d.signature(QUESTION.lower()), exclude="c")
+    assert [x["id"] for x in matches] == ["a"]
+    assert d.find_duplicates(d.signature(QUESTION), exclude="a") == []
+
+
+def test_duplicate_clusters():
+    d.index_question("a", d.signature(QUESTION))
+    d.index_question("b", d.signature(QUESTION + "!"))
+    d.index_question("c", d.signature(QUESTION.upper()))
+    d.index_question("x", d.signature("State and prove the remainder theorem."))
+    assert d.duplicate_clusters() == [["a", "b", "c"]]
+
+
+def test_unindex_question():
+    d.index_question("a", d.signature(QUESTION))
+    d.index_question("b", d.signature(QUESTION))
+    d.unindex_question("a")
+    assert d.duplicate_clusters() == []
+    assert all(bucket == "b" for band in d.bands for bucket in band.values())
+    d.unindex_question("b")
+    assert not any(d.bands)
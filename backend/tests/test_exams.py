@@ -0,0 +1,171 @@
+import asyncio
+from datetime import timedelta
+import pytest
+from bson.objectid import ObjectId
+from app.api.utils import exam_handler, grading_handler, trending_handler
+from app.api.utils.database_handler import ExamSessionModel
+
+KEYS = {
+    "p1": {"type": "single", "correct_answers": ["a"]},
+    "p2": {"type": "multiple", "correct_answers": ["a", "b"]},
+}
+
+
+class Store:
+    """Keeps exam sessions in memory in place of the exam session helpers."""
+
+    def __init__(self):
+        self.sessions: dict[str, dict] = {}
+        self.recorded: list[str] = []
+        self.key_reads = 0
+
+    def add(self, deadline_in: float = 60, **responses) -> ExamSessionModel:
+        now = exam_handler._now()
+        session = ExamSessionModel(
+            id=str(ObjectId()),
+            user=str(ObjectId()),
+            exam="jee",
+            problems=list(KEYS),
+            responses=responses,
+            started_at=now,
+            deadline=now + timedelta(seconds=deadline_in),
+        )
+        self.sessions[session.id] = session.model_dump()
+        return session
+
+    async def get_exam_session(self, session_id):
+        await asyncio.sleep(0)
+        if session_id not in self.sessions:
+            raise ValueError("Exam session not found")
+        return ExamSessionModel(**self.sessions[session_id])
+
+    async def save_exam_responses(self, responses):
+        for session_id, changed in responses.items():
+            stored = self.sessions[session_id]
+            if not stored["submitted"]:
+                stored["responses"].update(changed)
+
+    async def submit_exam_session(self, session):
+        await asyncio.sleep(0)
+        if self.sessions[session.id]["submitted"]:
+            return False
+        self.sessions[session.id] = session.model_dump()
+        return True
+
+    async def claim_expired_exam_sessions(self, grader, cutoff, limit, timeout):
+        claimed = []
+        for stored in self.sessions.values():
+            if len(claimed) < limit and not stored["submitted"]:
+                if stored["deadline"] <= cutoff and "grader" not in stored:
+                    stored["grader"] = grader
+                    claimed.append(ExamSessionModel(**stored))
+        return claimed
+
+    async def submit_exam_sessions(self, sessions, grader):
+        stored = []
+        for session in sessions:
+            current = self.sessions[session.id]
+            if not current["submitted"] and current.get("grader") == grader:
+                self.sessions[session.id] = {**session.model_dump(), "grader": grader}
+                stored.append(session.id)
+        return stored
+
+    async def get_answer_keys(self, problem_ids):
+        self.key_reads += 1
+        meta = {"subject": "physics", "category": "optics", "difficulty": "easy"}
+        return {x: {**KEYS[x], **meta} for x in problem_ids if x in KEYS}
+
+    async def enqueue(self, kind, func, user, results, batch_id):
+        self.recorded.append(batch_id)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = Store()
+    for name in (
+        "get_exam_session",
+        "save_exam_responses",
+        "submit_exam_session",
+        "claim_expired_exam_sessions",
+        "submit_exam_sessions",
+        "enqueue",
+    ):
+        monkeypatch.setattr(exam_handler, name, getattr(store, name))
+    monkeypatch.setattr(grading_handler, "get_answer_keys", store.get_answer_keys)
+    monkeypatch.setattr(trending_handler, "record", lambda *args: None)
+    yield store
+    exam_handler.sessions.clear()
+    exam_handler.dirty.clear()
+
+
+def test_concurrent_submits_grade_once(store):
+    session = store.add(p1=["a"])
+
+    async def main():
+        await exam_handler.record_response(session.id, session.user, "p2", ["b", "a"])
+        return await asyncio.gather(
+            exam_handler.submit_session(session.id, session.user),
+            exam_handler.submit_session(session.id, session.user),
+        )
+
+    first, second = asyncio.run(main())
+    assert store.recorded == [session.id]
+    assert first.result["score"] == second.result["score"] == 2
+    assert session.id not in exam_handler.sessions
+
+
+def test_submit_by_another_worker_is_not_recorded_again(store):
+    session = store.add(p1=["a"])
+
+    async def main():
+        await exam_handler.get_session(session.id, session.user)
+        store.sessions[session.id]["submitted"] = True
+        return await exam_handler.submit_session(session.id, session.user)
+
+    assert asyncio.run(main()).submitted
+    assert store.recorded == []
+
+
+def test_sessions_are_loaded_on_first_use(store):
+    session = store.add()
+
+    async def main():
+        await exam_handler.start_exam_engine()
+        await exam_handler.stop_exam_engine()
+        assert session.id not in exam_handler.sessions
+        await exam_handler.get_session(session.id, session.user)
+
+    asyncio.run(main())
+    assert session.id in exam_handler.sessions
+
+
+def test_expired_sessions_are_submitted_in_one_batch(store):
+    expired = [store.add(deadline_in=-60, p1=["a"]) for _ in range(3)]
+    running = store.add(deadline_in=60)
+    exam_handler.sessions[expired[0].id] = expired[0]
+
+    assert asyncio.run(exam_handler.submit_expired_sessions()) == 3
+    assert store.key_reads == 1
+    assert sorted(store.recorded) == sorted(x.id for x in expired)
+    assert all(store.sessions[x.id]["result"]["score"] == 1 for x in expired)
+    assert not store.sessions[running.id]["submitted"]
+    assert expired[0].id not in exam_handler.sessions
+
+
+def test_recently_expired_sessions_wait_for_flushes(store):
+    store.add(deadline_in=-1)
+    assert asyncio.run(exam_handler.submit_expired_sessions()) == 0
+
+
+def test_sessions_submitted_meanwhile_are_not_recorded(store, monkeypatch):
+    expired = store.add(deadline_in=-60)
+    claim = store.claim_expired_exam_sessions
+
+    async def claim_then_submit(*args):
+        claimed = await claim(*args)
+        store.sessions[expired.id]["submitted"] = True
+        return claimed
+
+    monkeypatch.setattr(exam_handler, "claim_expired_exam_sessions", claim_then_submit)
+    assert asyncio.run(exam_handler.submit_expired_sessions()) == 0
+    assert store.recorded == []
@@ -0,0 +1,81 @@
+import asyncio, csv, gzip, io, json
+import pytest
+from app.api.utils import export_handler
+
+
+def problem(i: int) -> dict:
+    return {
+        "id": str(i),
+        "exam": "jee",
+        "difficulty": "easy",
+        "type": "single",
+        "subject": "physics",
+        "category": "optics",
+        "question": f'Question {i}, with "quotes"?',
+        "options": ["a", "b"],
+        "correct_answers": ["a"],
+        "comments": [],
+    }
+
+
+@pytest.fixture
+def bank(monkeypatch):
+    problems = []
+
+    async def iter_problems(query, batch_size):
+        for x in problems:
+            yield dict(x)
+
+    monkeypatch.setattr(export_handler, "iter_problems", iter_problems)
+    monkeypatch.setattr(export_handler, "EXPORT_BATCH_SIZE", 3)
+    return problems
+
+
+def export(**kwargs) -> list[bytes]:
+    async def main():
+        return [x async for x in export_handler.export_problems({}, **kwargs)]
+
+    return asyncio.run(main())
+
+
+def test_ndjson_rows():
+    rows = export_handler._ndjson_rows([problem(1), problem(2)])
+    assert [json.loads(x) for x in rows.splitlines()] == [problem(1), problem(2)]
+
+
+def test_csv_rows_encode_lists_as_json():
+    rows = list(
+        csv.DictReader(io.StringIO(export_handler._csv_rows([problem(1)], True)))
+    )
+    assert rows[0]["question"] == problem(1)["question"]
+    assert json.loads(rows[0]["options"]) == ["a", "b"]
+    assert export_handler._csv_rows([problem(1)]).count("\n") == 1
+
+
+def test_ndjson_export_streams_every_batch(bank):
+    bank.extend(problem(i) for i in range(7))
+    chunks = export(format="ndjson")
+    assert len(chunks) == 3
+    assert b"".join(chunks).decode().count("\n") == 7
+
+
+def test_csv_export_writes_one_header(bank):
+    bank.extend(problem(i) for i in range(6))
+    rows = list(csv.reader(io.StringIO(b"".join(export(format="csv")).decode())))
+    assert rows[0] == export_handler.CSV_FIELDS
+    assert len(rows) == 7
+
+
+def test_empty_csv_export_still_has_a_header(bank):
+    assert b"".join(export(format="csv")).decode().strip() == ",".join(
+        export_handler.CSV_FIELDS
+    )
+
+
+@pytest.mark.parametrize("format", ["ndjson", "csv"])
+def test_compressed_export_is_one_gzip_stream(bank, format):
+    bank.extend(problem(i) for i in range(7))
+    plain = b"".join(export(format=format))
+    compressed = b"".join(export(format=format, compress=True))
+    assert compressed[:2] == b"\x1f\x8b"
+    assert gzip.decompress(compressed) == plain
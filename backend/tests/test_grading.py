@@ -0,0 +1,31 @@
+import pytest
+from app.api.utils.grading_handler import GradingError, is_correct
+
+
+def test_single():
+    assert is_correct("single", ["b"], ["b"])
+    assert not is_correct("single", ["b"], ["a"])
+    assert not is_correct("single", ["b"], ["b", "a"])
+
+
+def test_multiple_ignores_order():
+    assert is_correct("multiple", ["a", "c"], ["c", "a"])
+    assert not is_correct("multiple", ["a", "c"], ["a"])
+    assert not is_correct("multiple", ["a", "c"], ["a", "b", "c"])
+
+
+def test_integer_compares_values():
+    assert is_correct("integer", ["42"], [" 42.0 "])
+    assert is_correct("integer", ["1", "2"], ["2"])
+    assert not is_correct("integer", ["42"], ["41"])
+    assert not is_correct("integer", ["42"], ["forty two"])
+    assert not is_correct("integer", ["42"], ["42", "42"])
+
+
+def test_unattempted_is_wrong():
+    assert not is_correct("single", ["a"], [])
+
+
+def test_unknown_type():
+    with pytest.raises(GradingError):
+        is_correct("essay", ["a"], ["a"])
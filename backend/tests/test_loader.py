@@ -0,0 +1,70 @@
+import asyncio
+from bson.objectid import ObjectId
+from app.api.utils.database_handler import Loader
+
+
+class Store:
+    def __init__(self, *ids: ObjectId):
+        self.documents = {x: {"_id": x, "value": 0} for x in ids}
+        self.calls: list[list[ObjectId]] = []
+
+    async def fetch(self, ids: list[ObjectId]) -> list[dict]:
+        self.calls.append(ids)
+        found = [dict(self.documents[x]) for x in ids if x in self.documents]
+        await asyncio.sleep(0.01)
+        return found
+
+
+def test_coalesces_loads_in_one_tick():
+    a, b = ObjectId(), ObjectId()
+    store = Store(a, b)
+    loader = Loader(store.fetch)
+
+    async def main():
+        return await asyncio.gather(
+            loader.load(a), loader.load(b), loader.load(a), loader.load(ObjectId())
+        )
+
+    first, second, again, missing = asyncio.run(main())
+    assert len(store.calls) == 1
+    assert first["_id"] == again["_id"] == a and second["_id"] == b
+    assert missing is None
+    # Waiters get their own copies.
+    first["value"] = 1
+    assert again["value"] == 0
+
+
+def test_clear_refetches_after_write():
+    a = ObjectId()
+    store = Store(a)
+    loader = Loader(store.fetch)
+
+    async def main():
+        stale = asyncio.ensure_future(loader.load(a))
+        while not store.calls:
+            await asyncio.sleep(0)
+        store.documents[a]["value"] = 1
+        loader.clear(a)
+        fresh = await loader.load(a)
+        return await stale, fresh
+
+    stale, fresh = asyncio.run(main())
+    assert len(store.calls) == 2
+    assert (stale["value"], fresh["value"]) == (0, 1)
+    assert not loader.inflight and not loader.tasks
+
+
+def test_fetch_errors_reach_every_waiter():
+    async def fetch(ids):
+        raise RuntimeError("down")
+
+    loader = Loader(fetch)
+
+    async def main():
+        return await asyncio.gather(
+            loader.load(ObjectId()), loader.load(ObjectId()), return_exceptions=True
+        )
+
+    errors = asyncio.run(main())
+    assert all(isinstance(x, RuntimeError) for x in errors)
+    assert not loader.inflight
@@ -0,0 +1,61 @@
+import argparse, asyncio
+import pytest
+from pymongo import errors
+from app.api import manage
+from app.api.utils import database_handler
+
+
+class Database:
+    """Stands in for a database that another worker creates a collection in."""
+
+    def __init__(self, error: Exception):
+        self.error = error
+        self.commands = []
+
+    async def list_collection_names(self):
+        return []
+
+    async def create_collection(self, name, **kwargs):
+        raise self.error
+
+    async def command(self, *args, **kwargs):
+        self.commands.append(args)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        errors.CollectionInvalid("collection problems already exists"),
+        errors.OperationFailure("Collection already exists", code=48),
+    ],
+)
+def test_ensure_collection_tolerates_a_concurrent_create(monkeypatch, error):
+    database = Database(error)
+    monkeypatch.setattr(database_handler, "client", {"problems": database})
+    asyncio.run(database_handler.ensure_collection("problems", "problems", {}))
+    assert database.commands == [("collMod", "problems")]
+
+
+def test_ensure_collection_raises_other_errors(monkeypatch):
+    database = Database(errors.OperationFailure("Unauthorized", code=13))
+    monkeypatch.setattr(database_handler, "client", {"problems": database})
+    with pytest.raises(errors.OperationFailure):
+        asyncio.run(database_handler.ensure_collection("problems", "problems", {}))
+
+
+def test_seed_applies_migrations_first(monkeypatch):
+    calls = []
+
+    async def record(name, *args):
+        calls.append(name)
+        return {}
+
+    monkeypatch.setattr(manage, "open_db", lambda: record("open"))
+    monkeypatch.setattr(manage, "close_db", lambda: record("close"))
+    monkeypatch.setattr(manage, "run_migrations", lambda: record("migrate"))
+    monkeypatch.setattr(manage, "seed", lambda *args: record("seed"))
+    args = argparse.Namespace(
+        command="seed", problems=1, users=0, comments=0, seed=None, batch_size=1
+    )
+    asyncio.run(manage.main(args))
+    assert calls == ["open", "migrate", "seed", "close"]
@@ -0,0 +1,63 @@
+import asyncio
+from app.api.utils.profile_handler import current_profile, db_time, profiled
+
+
+def span(start: float, duration: float, depth: int = 0) -> dict:
+    return {"name": "x", "depth": depth, "start_ms": start, "duration_ms": duration}
+
+
+def test_db_time_merges_overlapping_spans():
+    assert db_time([]) == 0
+    assert db_time([span(0, 10), span(20, 5)]) == 15
+    assert db_time([span(0, 10), span(5, 10)]) == 15
+    assert db_time([span(5, 2), span(0, 10)]) == 10
+
+
+def test_db_time_skips_nested_spans():
+    assert db_time([span(0, 10), span(1, 8, depth=1), span(2, 2, depth=2)]) == 10
+
+
+@profiled
+async def inner():
+    await asyncio.sleep(0)
+
+
+@profiled
+async def outer():
+    await inner()
+    await inner()
+
+
+def new_profile() -> dict:
+    return {"spans": [], "_started": 0.0, "_finished": False}
+
+
+def test_profiled_records_depth():
+    profile = new_profile()
+
+    async def main():
+        current_profile.set(profile)
+        await outer()
+
+    asyncio.run(main())
+    assert [(x["name"], x["depth"]) for x in profile["spans"]] == [
+        ("inner", 1),
+        ("inner", 1),
+        ("outer", 0),
+    ]
+
+
+def test_finished_profiles_take_no_more_spans():
+    profile = new_profile()
+
+    async def main():
+        current_profile.set(profile)
+        # Started by the request, still running after the response is sent.
+        running = asyncio.create_task(outer())
+        await asyncio.sleep(0)
+        profile["_finished"] = True
+        await running
+        await outer()
+
+    asyncio.run(main())
+    assert profile["spans"] == []
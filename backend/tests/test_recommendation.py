@@ -0,0 +1,72 @@
+import pytest
+from app.api.utils import recommendation_handler as r
+from app.api.utils.database_handler import UserStatsModel
+
+
+@pytest.fixture(autouse=True)
+def index():
+    for i in range(30):
+        r.index_problem(
+            f"p{i}",
+            exam="jee" if i < 20 else "neet",
+            subject="physics",
+            category="optics" if i % 2 else "waves",
+            difficulty=r.DIFFICULTIES[i % 3],
+        )
+    yield
+    r.buckets.clear()
+    r.positions.clear()
+    r.metadata.clear()
+
+
+def stats(**categories) -> UserStatsModel:
+    return UserStatsModel(id="u", subjects={"physics": {"categories": categories}})
+
+
+def test_recommends_unattempted_problems():
+    attempted = {"p0", "p1"}
+    picked = [x["id"] for x in r.recommend(stats(), attempted, count=10)]
+    assert len(picked) == 10
+    assert len(set(picked)) == 10
+    assert not set(picked) & attempted
+
+
+def test_filters_by_exam():
+    picked = r.recommend(stats(), set(), count=50, exam="neet")
+    assert len(picked) == 10
+    assert all(r.metadata[x["id"]]["exam"] == "neet" for x in picked)
+
+
+def test_weakest_category_first():
+    weak = stats(
+        optics={"attempts": 6, "correct": 0}, waves={"attempts": 6, "correct": 6}
+    )
+    picked = r.recommend(weak, {f"p{i}" for i in range(12)}, count=1)
+    assert picked[0]["category"] == "optics"
+    assert picked[0]["difficulty"] == "easy"
+
+
+def test_unattempted_categories_rank_between():
+    mixed = stats(
+        optics={"attempts": 4, "correct": 0}, waves={"attempts": 4, "correct": 4}
+    )
+    assert r._accuracy(mixed, "physics", "optics") < 0.5
+    assert r._accuracy(mixed, "physics", "heat") == 0.5
+    assert r._accuracy(mixed, "chemistry", "waves") == 0.5
+    assert r._accuracy(mixed, "physics", "waves") > 0.5
+
+
+def test_unindex_moves_last_into_place():
+    r.unindex_problem("p0")
+    assert "p0" not in r.metadata
+    for key, bucket in r.buckets.items():
+        for position, problem_id in enumerate(bucket):
+            assert r.positions[problem_id] == position
+            assert r._key(r.metadata[problem_id]) == key
+
+
+def test_reindex_ignores_unknown_ids():
+    r.reindex_problem("missing", difficulty="hard")
+    assert "missing" not in r.metadata
+    r.reindex_problem("p0", difficulty="hard")
+    assert "p0" in r.buckets[("jee", "physics", "waves", "hard")]
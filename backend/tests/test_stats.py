@@ -0,0 +1,45 @@
+from bson.objectid import ObjectId
+from app.api.utils.database_handler import _build_stats, _streaks
+
+
+def test_streaks():
+    assert _streaks([]) == (0, 0)
+    assert _streaks([5]) == (1, 1)
+    assert _streaks([3, 1, 2, 7, 8]) == (2, 3)
+    assert _streaks([1, 2, 3, 10]) == (1, 3)
+
+
+def group(subject, category, attempts, correct, days):
+    return {
+        "_id": {"subject": subject, "category": category},
+        "attempts": attempts,
+        "correct": correct,
+        "days": days,
+    }
+
+
+def test_build_stats():
+    user = ObjectId()
+    stats = _build_stats(
+        user,
+        [
+            group("physics", "optics", 3, 2, [10, 11]),
+            group("physics", "waves", 1, 0, [11]),
+            group("chemistry", "org.anic", 2, 2, [12, 20]),
+        ],
+    )
+    assert stats["_id"] == user
+    assert (stats["attempts"], stats["correct"]) == (6, 4)
+    physics = stats["subjects"]["physics"]
+    assert (physics["attempts"], physics["correct"]) == (4, 2)
+    assert physics["categories"]["waves"] == {"attempts": 1, "correct": 0}
+    assert "org_anic" in stats["subjects"]["chemistry"]["categories"]
+    assert (stats["current_streak"], stats["longest_streak"]) == (1, 3)
+    assert stats["last_active_day"] == 20
+
+
+def test_build_stats_without_attempts():
+    stats = _build_stats(ObjectId(), [])
+    assert stats["attempts"] == 0
+    assert (stats["current_streak"], stats["longest_streak"]) == (0, 0)
+    assert stats["last_active_day"] is None
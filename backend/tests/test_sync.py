@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+from bson.objectid import ObjectId
+from app.api.utils import database_handler
+from app.api.utils.database_handler import _settled_page
+
+
+def change(version: int, settled: bool = True) -> dict:
+    return {"_id": ObjectId(), "version": version, "_settled": settled}
+
+
+def test_page_stops_before_the_first_settling_write():
+    # Q reserved v4 and P v5, but Q landed after P and is still settling.
+    changes = [change(3), change(4, settled=False), change(5)]
+    page, has_more = _settled_page(changes, 10)
+    assert [x["version"] for x in page] == [3]
+    assert not has_more
+
+
+def test_page_with_nothing_settled_is_empty():
+    page, has_more = _settled_page([change(4, settled=False), change(5)], 10)
+    assert page == [] and not has_more
+
+
+def test_full_page_reports_more():
+    changes = [change(v) for v in range(1, 6)]
+    page, has_more = _settled_page(changes, 3)
+    assert [x["version"] for x in page] == [1, 2, 3]
+    assert has_more
+    assert not _settled_page([change(v) for v in range(1, 4)], 3)[1]
+
+
+def test_unsettled_change_past_the_limit_is_not_a_cut():
+    changes = [change(1), change(2), change(3, settled=False)]
+    page, has_more = _settled_page(changes, 2)
+    assert [x["version"] for x in page] == [1, 2]
+    assert has_more
+
+
+class Collection:
+    """Applies the version match and limit of a change pipeline to fixed documents."""
+
+    def __init__(self, documents: list[dict]):
+        self.documents = documents
+
+    def aggregate(self, pipeline: list[dict]):
+        since = pipeline[0]["$match"]["version"]["$gt"]
+        limit = pipeline[2]["$limit"]
+        found = sorted(
+            (dict(x) for x in self.documents if x["version"] > since),
+            key=lambda x: x["version"],
+        )[:limit]
+
+        async def to_list(length):
+            return found
+
+        return SimpleNamespace(to_list=to_list)
+
+
+def problem(version: int, settled: bool = True) -> dict:
+    return {
+        "_id": ObjectId(),
+        "exam": "jee",
+        "difficulty": "easy",
+        "type": "single",
+        "subject": "physics",
+        "category": "optics",
+        "question": f"Question {version}?",
+        "correct_answers": ["a"],
+        "options": ["a", "b", "c", "d"],
+        "comments": [],
+        "version": version,
+        "updated_at": None,
+        "_settled": settled,
+    }
+
+
+def tombstone(version: int, settled: bool = True) -> dict:
+    return {
+        "_id": ObjectId(),
+        "version": version,
+        "deleted_at": None,
+        "_settled": settled,
+    }
+
+
+def test_changes_merge_problems_and_tombstones(monkeypatch):
+    problems = [problem(1), problem(3), problem(5)]
+    tombstones = [tombstone(2), tombstone(4, settled=False)]
+    db = SimpleNamespace(
+        problems=Collection(problems), tombstones=Collection(tombstones)
+    )
+    monkeypatch.setattr(database_handler, "problems_db", db, raising=False)
+
+    op = asyncio.run(database_handler.get_problem_changes(0, 10, 2))
+    assert [x.question for x in op["problems"]] == ["Question 1?", "Question 3?"]
+    assert op["deleted"] == [str(tombstones[0]["_id"])]
+    assert op["version"] == 3
+    assert not op["has_more"]
+
+    op = asyncio.run(database_handler.get_problem_changes(3, 10, 2))
+    assert op["problems"] == [] and op["deleted"] == []
+    assert op["version"] == 3
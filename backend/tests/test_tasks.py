@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+from app.api.utils import task_handler
+from app.api.utils.profile_handler import current_profile
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    yield
+    task_handler.metrics.clear()
+    task_handler.running = False
+
+
+def test_retries_with_doubling_backoff(monkeypatch):
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record_sleep(delay):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", record_sleep)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("busy")
+
+    asyncio.run(task_handler._run("flaky", flaky, (), {}))
+    backoff = task_handler.BACKOFF
+    assert delays == [backoff, backoff * 2]
+    stats = task_handler.metrics["flaky"]
+    assert (stats["retried"], stats["done"], stats["failed"]) == (2, 1, 0)
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(task_handler, "BACKOFF", 0)
+    calls = []
+
+    async def broken():
+        calls.append(1)
+        raise RuntimeError("down")
+
+    asyncio.run(task_handler._run("broken", broken, (), {}))
+    assert len(calls) == task_handler.MAX_RETRIES + 1
+    assert task_handler.metrics["broken"]["failed"] == 1
+
+
+def test_runs_inline_when_stopped():
+    done = []
+
+    async def task(x):
+        done.append(x)
+
+    asyncio.run(task_handler.enqueue("log", task, 1))
+    assert done == [1]
+    assert "log" not in task_handler.queues
+
+
+def test_stop_drains_every_queue():
+    done = []
+
+    async def task(x):
+        await asyncio.sleep(0.01)
+        done.append(x)
+
+    async def main():
+        await task_handler.start_task_workers()
+        for i in range(6):
+            await task_handler.enqueue("sweep" if i % 2 else "log", task, i)
+        await task_handler.stop_task_workers()
+
+    asyncio.run(main())
+    assert sorted(done) == list(range(6))
+    assert not task_handler.queues and not task_handler.workers
+
+
+def test_stop_gives_up_on_slow_tasks(monkeypatch, caplog):
+    monkeypatch.setattr(task_handler, "DRAIN_TIMEOUT", 0.05)
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def main():
+        await task_handler.start_task_workers()
+        for _ in range(3):
+            await task_handler.enqueue("sweep", slow)
+        await task_handler.stop_task_workers()
+
+    asyncio.run(asyncio.wait_for(main(), timeout=5))
+    assert "Dropped 2 tasks" in caplog.text
+
+
+def test_workers_do_not_inherit_the_request_context():
+    seen = []
+
+    async def task():
+        seen.append(current_profile.get())
+
+    async def request():
+        current_profile.set({"spans": []})
+        await task_handler.enqueue("log", task)
+
+    async def main():
+        await task_handler.start_task_workers()
+        await asyncio.create_task(request())
+        await task_handler.enqueue("log", task)
+        await task_handler.stop_task_workers()
+
+    asyncio.run(main())
+    assert seen == [None, None]
@@ -0,0 +1,71 @@
+import pytest
+from app.api.utils import trending_handler as t
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(t, "time", clock)
+    monkeypatch.setattr(t, "landmark", clock.now)
+    yield clock
+    t.counters.clear()
+    t.pending.clear()
+    t.snapshot = []
+
+
+def test_local_top_orders_by_decayed_score(clock):
+    t.record("a")
+    t.record("b", "attempt")
+    t.record("c")
+    t.record("c")
+    top = t.local_top(2)
+    assert [x["id"] for x in top] == ["b", "c"]
+    assert top[0] == {"id": "b", "score": 3.0, "views": 0, "attempts": 1}
+    clock.now += t.HALF_LIFE
+    assert t.local_top(1)[0]["score"] == pytest.approx(1.5)
+
+
+def test_older_events_weigh_less(clock):
+    t.record("old", "attempt")
+    clock.now += 2 * t.HALF_LIFE
+    t.record("new")
+    t.record("new")
+    assert [x["id"] for x in t.local_top()] == ["new", "old"]
+
+
+def test_boost_rebases_before_losing_precision(clock):
+    t.record("a")
+    clock.now += 70 * t.HALF_LIFE
+    t.record("b")
+    assert t.landmark == clock.now
+    assert t.counters["b"][0] == 1.0
+    assert t.counters["a"][0] == pytest.approx(2**-70)
+    assert t.pending["a"][0] == pytest.approx(2**-70)
+    assert [x["id"] for x in t.local_top()] == ["b", "a"]
+
+
+def test_prune_keeps_the_heaviest(monkeypatch):
+    monkeypatch.setattr(t, "CAPACITY", 3)
+    table = {str(i): [float(i), i, 0] for i in range(7)}
+    t._prune(table)
+    assert sorted(table) == ["4", "5", "6"]
+    small = {str(i): [float(i), i, 0] for i in range(6)}
+    t._prune(small)
+    assert len(small) == 6
+
+
+def test_forget_drops_deleted_problems():
+    t.record("a")
+    t.record("b")
+    t.snapshot = t.local_top()
+    t.forget(["a"])
+    assert "a" not in t.counters and "a" not in t.pending
+    assert [x["id"] for x in t.trending()] == ["b"]